@@ -0,0 +1,57 @@
+'''
+Processing of Nortek Vectrino ADV records for the CEE440 flume lab.
+
+The package does not import Streamlit or Plotly, so it can be used from
+the app pages, the notebooks, worker processes and scripts alike. Its
+functions are re-exported here and loaded with their submodule when first
+used.
+
+    reader      netCDF files to pandas, whole, lazily or in chunks
+    statistics  Reynolds decomposition, quality control, despiking, bootstrap
+    spectra     Welch spectra, autocorrelation and integral time scales
+    profiles    file summaries, velocity profiles and campaigns, log-law fit
+    hydraulics  friction factor and roughness of uniform flow runs
+    plotting    downsampling of long records for display
+    results     bounded store of the results of each file in a session
+    jobs        worker pool shared by the sessions of a server
+    conversion  batch conversion of campaign folders to Parquet/Feather
+
+Campaign folders can also be summarized from the command line, see
+`python -m adv_processing --help`.
+'''
+import importlib
+
+## Submodule defining each public name. Submodules are imported on first
+## access, so e.g. the hydraulics do not pay for netCDF4 or the readers
+_EXPORTS = {
+  'reader'     : ['USED_COLUMNS', 'ABSOLUTE_TIME_COLUMNS', 'timeVariables', 'selectColumns',
+                  'groupToDataFrame', 'SharedDataset', 'LazyGroup', 'readFile', 'readBuffer',
+                  'readDataset', 'iterChunks'],
+  'statistics' : ['VELOCITY_COLUMNS', 'RHO_WATER', 'CORRELATION_COLUMNS', 'SNR_COLUMNS',
+                  'VelocityMoments', 'reynoldsStats', 'reynoldsFromMoments', 'chunkedMeanStd',
+                  'qualityMask', 'phaseSpaceDespike', 'despikeFrame', 'blockBootstrap'],
+  'spectra'    : ['samplingRate', 'welchPSD', 'inertialSlope', 'logBin', 'autocorrelation',
+                  'integralTimeScale', 'effectiveSamples'],
+  'profiles'   : ['assembleSummary', 'fileSummary', 'buildProfile', 'summarizeFile', 'summarizeFolder', 'fitLogLaw'],
+  'hydraulics' : ['FLUME_WIDTH', 'NU_WATER', 'GRAVITY', 'colebrookFriction',
+                  'roughnessFromFriction', 'vanRijnRoughness', 'uniformFlow'],
+  'plotting'   : ['minMaxDownsample'],
+  'results'    : ['RESULT_FIELDS', 'ResultsStore'],
+  'jobs'       : ['JobPool', 'sharedPool'],
+  'conversion' : ['OUTPUT_FORMATS', 'STATE_FILE', 'writeChunks', 'findFiles', 'fileDigest',
+                  'loadState', 'isUpToDate', 'convertFile', 'convertFolder']
+}
+
+_MODULE_OF = {name:module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = list(_MODULE_OF)
+
+def __getattr__(name):
+  if name not in _MODULE_OF:
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+  value = getattr(importlib.import_module(f".{_MODULE_OF[name]}", __name__), name)
+  globals()[name] = value
+  return value
+
+def __dir__():
+  return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,96 @@
+'''
+Headless processing of a campaign folder of Vectrino files, e.g.,
+
+    python -m adv_processing Lab1-2022/morning-data/trough -o trough.parquet
+
+Every .nc file under the folder is summarized in parallel (elevation, mean
+velocities, Reynolds stresses, tke and their bootstrap intervals, see
+fileSummary) and the table is written as Parquet or JSON together with
+the timing of the run. Run it from the root of the repository or with
+the repository in PYTHONPATH, as the package is not installed.
+'''
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+from .profiles import summarizeFolder
+
+## Output formats and their file suffix
+SUMMARY_FORMATS = {'parquet':'.parquet', 'json':'.json'}
+
+def writeSummary(summary, info, outPath, fmt):
+  '''
+  Writes the table of a campaign and its run information (source,
+  options, timing). In Parquet the information goes in the file metadata
+  under the `adv_processing` key, in JSON next to the list of files.
+  '''
+  if fmt == 'parquet':
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(summary, preserve_index=False)
+    metadata = dict(table.schema.metadata or {}, adv_processing=json.dumps(info))
+    pq.write_table(table.replace_schema_metadata(metadata), outPath, compression='zstd')
+  else:
+    with open(outPath, "w") as f:
+      json.dump(dict(info, files=json.loads(summary.to_json(orient='records'))), f, indent=1)
+
+def parseArguments(argv=None):
+  parser = argparse.ArgumentParser(prog="python -m adv_processing",
+    description="Summarize every .nc file of a campaign folder (e.g., Lab1-2022/morning-data/trough).")
+  parser.add_argument("campaign", help="folder with the .nc files, searched recursively")
+  parser.add_argument("-o", "--output",
+    help="summary file, by default summary.<format> inside the campaign folder")
+  parser.add_argument("-f", "--format", choices=list(SUMMARY_FORMATS),
+    help="output format, by default from the suffix of --output or parquet")
+  parser.add_argument("-j", "--workers", type=int, default=None,
+    help="worker processes, by default one per CPU")
+  parser.add_argument("--probe-dist", type=float, default=0.05,
+    help="distance between the probe and the sampling volume [m] (default: 0.05)")
+  parser.add_argument("--no-despike", dest="despike", action="store_false",
+    help="skip the phase-space despiking")
+  parser.add_argument("--n-boot", type=int, default=1000,
+    help="bootstrap resamples for the confidence intervals, 0 to skip (default: 1000)")
+  parser.add_argument("-q", "--quiet", action="store_true",
+    help="do not report each file as it finishes")
+  return parser.parse_args(argv)
+
+def main(argv=None):
+  args = parseArguments(argv)
+
+  if not os.path.isdir(args.campaign):
+    print(f"{args.campaign} is not a folder", file=sys.stderr)
+    return 2
+
+  fmt = args.format
+  if fmt is None:
+    suffix = os.path.splitext(args.output or "")[1].lower()
+    fmt = next((k for k, v in SUMMARY_FORMATS.items() if v == suffix), 'parquet')
+  outPath = args.output or os.path.join(args.campaign, "summary" + SUMMARY_FORMATS[fmt])
+
+  def report(record):
+    if not args.quiet:
+      status = record['status'] if record['status'] == 'processed' else f"failed ({record['error']})"
+      print(f"{record['seconds']:7.2f} s  {record['file']}  {status}", file=sys.stderr)
+
+  created = datetime.now().isoformat(timespec='seconds')
+  summary, timing = summarizeFolder(args.campaign, args.probe_dist, args.workers,
+                                    args.despike, args.n_boot, progress=report)
+
+  info = {
+    'created' : created,
+    'source'  : os.path.abspath(args.campaign),
+    'options' : {'probeDist':args.probe_dist, 'despike':args.despike, 'nBoot':args.n_boot},
+    'timing'  : timing
+  }
+  writeSummary(summary, info, outPath, fmt)
+
+  print(f"{timing['processed']} of {timing['files']} files summarized in {timing['wallSeconds']:.1f} s "
+        f"with {timing['workers']} workers ({timing['filesPerSecond']:.2f} files/s) -> {outPath}",
+        file=sys.stderr)
+  return 1 if timing['failed'] else 0
+
+if __name__ == "__main__":
+  sys.exit(main())
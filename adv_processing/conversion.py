@@ -0,0 +1,215 @@
+'''
+Batch conversion of campaign folders of Vectrino files into Parquet or
+Feather.
+'''
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+from .reader import readFile, iterChunks
+
+def writeChunks(chunks, outPath, fmt='parquet', compression='zstd'):
+  '''
+  Writes a stream of dataframes (e.g., from iterChunks) into a single
+  Parquet or Feather file, one row group / record batch per chunk.
+  Returns the number of rows written.
+  '''
+  import pyarrow as pa
+  import pyarrow.parquet as pq
+
+  writer, rows = None, 0
+  try:
+    for chunk in chunks:
+      table = pa.Table.from_pandas(chunk, preserve_index=False)
+      if writer is None:
+        if fmt == 'parquet':
+          writer = pq.ParquetWriter(outPath, table.schema, compression=compression)
+        else:
+          options = pa.ipc.IpcWriteOptions(compression=compression)
+          writer = pa.ipc.new_file(outPath, table.schema, options=options)
+      writer.write_table(table)
+      rows += len(chunk)
+  finally:
+    if writer is not None:
+      writer.close()
+
+  return rows
+
+## Columnar formats supported by the converter and their file suffix
+OUTPUT_FORMATS = {'parquet':'.parquet', 'feather':'.feather'}
+
+## State kept in the output folder by the incremental conversion
+STATE_FILE = ".convert_state.json"
+
+def findFiles(srcDir, suffix=".nc"):
+  '''
+  Paths of all the files ending in `suffix` under srcDir, sorted and
+  relative to it, e.g., morning-data/trough/z01.nc
+  '''
+  found = []
+  for root, _, files in os.walk(srcDir):
+    for file in files:
+      if file.endswith(suffix):
+        found.append(os.path.relpath(os.path.join(root,file), srcDir))
+  return sorted(found)
+
+def fileDigest(filePath, blockSize=1<<20):
+  '''SHA-256 of the contents of a file, read in blocks'''
+  h = hashlib.sha256()
+  with open(filePath,"rb") as f:
+    for block in iter(lambda: f.read(blockSize), b""):
+      h.update(block)
+  return h.hexdigest()
+
+def loadState(outDir):
+  '''
+  Reads the incremental conversion state of outDir, a dict
+  {relative source path: record}. Empty if there is none.
+  '''
+  statePath = os.path.join(outDir, STATE_FILE)
+  if not os.path.exists(statePath):
+    return {}
+  with open(statePath) as f:
+    return json.load(f)
+
+def isUpToDate(previous, srcPath, outDir, optionsKey):
+  '''
+  Checks whether the converted outputs in a state record still match the
+  source file. Size and mtime are compared first, and the content hash is
+  only computed if the file was touched without changing its size.
+  Returns the (possibly refreshed) record if up to date, None otherwise.
+  '''
+  if previous is None or previous.get('status') != 'converted' or previous.get('options') != optionsKey:
+    return None
+
+  if not all(os.path.exists(os.path.join(outDir,o)) for o in previous['outputs'].values()):
+    return None
+
+  stat = os.stat(srcPath)
+  if stat.st_size != previous['size']:
+    return None
+  if stat.st_mtime == previous['mtime']:
+    return previous
+  if fileDigest(srcPath) == previous['sha256']:
+    return dict(previous, mtime=stat.st_mtime)
+  return None
+
+def convertFile(srcDir, relPath, outDir, fmt='parquet', compression='zstd', columns=None, dtype=None, digest=False, chunkSize=None):
+  '''
+  Converts a single Vectrino file into <name>.velocity.<fmt> and
+  <name>.bottom.<fmt>, keeping its relative location inside outDir.
+  Returns the manifest record of the file. With `digest=True` the record
+  also has the size, mtime and content hash of the source. With
+  `chunkSize`, the velocities are streamed in windows of that many samples.
+  '''
+  start = time.perf_counter()
+  record = {'source':relPath}
+
+  try:
+    if digest:
+      srcPath = os.path.join(srcDir,relPath)
+      stat = os.stat(srcPath)
+      record.update(size=stat.st_size, mtime=stat.st_mtime, sha256=fileDigest(srcPath))
+
+    srcPath = os.path.join(srcDir,relPath)
+    if chunkSize is None:
+      prof, bott = readFile(srcPath, columns=columns, dtype=dtype)
+    else:
+      prof = iterChunks(srcPath, chunkSize, columns=columns, dtype=dtype)
+      bott, = readFile(srcPath, columns=columns, groups=('BottomCheck',), dtype=dtype)
+
+    base = os.path.join(outDir, relPath.removesuffix(".nc"))
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+
+    outputs, rows = {}, {}
+    for name, df in (('velocity',prof),('bottom',bott)):
+      outPath = base + f".{name}" + OUTPUT_FORMATS[fmt]
+      if not isinstance(df, pd.DataFrame):
+        rows[name] = writeChunks(df, outPath, fmt, compression)
+      else:
+        if fmt == 'parquet':
+          df.to_parquet(outPath, compression=compression, index=False)
+        else:
+          df.to_feather(outPath, compression=compression)
+        rows[name] = len(df)
+      outputs[name] = os.path.relpath(outPath, outDir)
+
+    record.update(status='converted', outputs=outputs, rows=rows)
+
+  except Exception as e:
+    record.update(status='failed', error=f"{type(e).__name__}: {e}")
+
+  record['seconds'] = time.perf_counter() - start
+  return record
+
+def convertFolder(srcDir, outDir=None, fmt='parquet', compression='zstd', workers=None, columns=None, dtype=None, incremental=False, chunkSize=None):
+  '''
+  Converts every .nc file under srcDir (e.g., a whole lab campaign with
+  its morning/afternoon and trough/crest folders) into compressed Parquet
+  or Feather files, one file per worker process.
+
+  Outputs go to outDir (by default, next to the sources) together with a
+  manifest.json listing what was converted. The manifest is also returned.
+  Files that cannot be read are reported in the manifest as failed.
+
+  With `incremental=True`, the size, mtime and content hash of every
+  source are kept in a state file in outDir, and files whose outputs are
+  already up to date are skipped (reported as such in the manifest).
+  `chunkSize` bounds the memory used per worker, see convertFile.
+  '''
+  if fmt not in OUTPUT_FORMATS:
+    raise ValueError(f"fmt must be one of {list(OUTPUT_FORMATS)}, got '{fmt}'")
+
+  outDir = srcDir if outDir is None else outDir
+  os.makedirs(outDir, exist_ok=True)
+
+  start = time.perf_counter()
+  files = findFiles(srcDir)
+  options = dict(fmt=fmt, compression=compression, columns=columns, dtype=dtype)
+
+  # Skip the files converted before with the same options
+  skipped, pending = [], files
+  if incremental:
+    state = loadState(outDir)
+    optionsKey = repr(sorted(options.items()))
+    pending = []
+    for f in files:
+      previous = isUpToDate(state.get(f), os.path.join(srcDir,f), outDir, optionsKey)
+      if previous is None:
+        pending.append(f)
+      else:
+        skipped.append(dict(previous, status='skipped', seconds=0.0))
+
+  if workers == 1 or len(pending) <= 1:
+    records = [convertFile(srcDir, f, outDir, digest=incremental, chunkSize=chunkSize, **options) for f in pending]
+  else:
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+      futures = [pool.submit(convertFile, srcDir, f, outDir, digest=incremental, chunkSize=chunkSize, **options) for f in pending]
+      records = [future.result() for future in as_completed(futures)]
+
+  if incremental:
+    newState = {r['source']:dict(r, status='converted') for r in skipped}
+    newState.update({r['source']:dict(r, options=optionsKey) for r in records if r['status'] == 'converted'})
+    with open(os.path.join(outDir,STATE_FILE),"w") as f:
+      json.dump(newState, f, indent=1)
+
+  records += skipped
+
+  manifest = {
+    'created' : datetime.now().isoformat(timespec='seconds'),
+    'source'  : os.path.abspath(srcDir),
+    'format'  : fmt,
+    'compression' : compression,
+    'seconds' : time.perf_counter() - start,
+    'files'   : sorted(records, key=lambda r: r['source'])
+  }
+
+  with open(os.path.join(outDir,"manifest.json"),"w") as f:
+    json.dump(manifest, f, indent=2, default=str)
+
+  return manifest
@@ -0,0 +1,88 @@
+'''
+Uniform flow characterization of the flume: friction factor and roughness.
+'''
+import numpy as np
+import pandas as pd
+
+from .statistics import RHO_WATER
+
+## Width of the flume used in the lab [m]
+FLUME_WIDTH = 0.205
+
+## Kinematic viscosity of water [m²/s] and gravitational acceleration [m/s²]
+NU_WATER = 1.0e-6
+GRAVITY = 9.81
+
+def colebrookFriction(ks, RH, Re, tol=1e-10, maxIter=50):
+  '''
+  Friction factor f of a channel from 1/√f = -2 log(ks/12R_H + 2.5/(R√f)),
+  solved by Newton iteration on 1/√f for arrays of runs all at once.
+  '''
+  ks, RH, Re = np.broadcast_arrays(*[np.asarray(v, dtype=np.float64) for v in (ks, RH, Re)])
+  relative = ks / (12*RH)
+  x = np.full(ks.shape, 8.0)
+
+  for _ in range(maxIter):
+    inner = relative + 2.5*x/Re
+    F = x + 2*np.log10(inner)
+    dF = 1 + 2*(2.5/Re) / (np.log(10)*inner)
+    step = F / dF
+    x = x - step
+    if np.all(np.abs(step) < tol):
+      break
+
+  return 1/x**2
+
+def roughnessFromFriction(f, RH, Re):
+  '''
+  Roughness height ks [m] that gives the friction factor f, inverting the
+  same relation as colebrookFriction. NaN when the flow is smoother than
+  what the relation allows (ks ≤ 0).
+  '''
+  sqrtF = np.sqrt(f)
+  ks = 12*RH * (10**(-1/(2*sqrtF)) - 2.5/(Re*sqrtF))
+  return np.where(ks > 0, ks, np.nan)
+
+def vanRijnRoughness(d90, height, length):
+  '''
+  Roughness height of a bed with dunes of `height` Δ and `length` λ over
+  sediment of size d90, ks = 3d90 + 1.1Δ(1 - exp(-25Δ/λ)), all in meters.
+  '''
+  return 3*d90 + 1.1*height*(1 - np.exp(-25*height/length))
+
+def uniformFlow(Q, depth, slope, width=FLUME_WIDTH, ksBed=None, nu=NU_WATER, rho=RHO_WATER, g=GRAVITY):
+  '''
+  Uniform flow characterization of a table of flume runs. The flow rate Q
+  [m³/s], depth [m] and slope can be arrays (one value per run) or scalars
+  (a single run). Returns a dataframe with the hydraulic radius RH, bulk
+  velocity U, Reynolds number Re = 4UR_H/ν, bed shear stress tau0, shear
+  velocity ustar, viscous sublayer thickness deltaV, the friction factor
+  f from Darcy-Weisbach and the roughness ks inverted from it. If a bed
+  roughness ksBed is given (e.g., from vanRijnRoughness), the friction
+  factor it predicts is added as fBed.
+  '''
+  Q, depth, slope, width = np.broadcast_arrays(*[np.atleast_1d(np.asarray(v, dtype=np.float64)) \
+                                                 for v in (Q, depth, slope, width)])
+  RH = width*depth / (2*depth + width)
+  U = Q / (width*depth)
+  Re = 4*U*RH / nu
+  tau0 = rho*g*RH*slope
+  ustar = np.sqrt(tau0/rho)
+  f = 8*g*RH*slope / U**2
+
+  results = pd.DataFrame({
+    'RH'     : RH,
+    'U'      : U,
+    'Re'     : Re,
+    'tau0'   : tau0,
+    'ustar'  : ustar,
+    'deltaV' : 11.6*nu/ustar,
+    'f'      : f,
+    'ks'     : roughnessFromFriction(f, RH, Re)
+  })
+
+  if ksBed is not None:
+    results['ksBed'] = np.broadcast_to(ksBed, RH.shape)
+    results['fBed'] = colebrookFriction(results['ksBed'], RH, Re)
+
+  return results
@@ -0,0 +1,207 @@
+'''
+Background execution of processing jobs in a pool of workers shared by
+every session of a server.
+'''
+import os
+import sys
+import types
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+class JobPool:
+  '''
+  Pool of at most `maxWorkers` worker processes (or threads, with
+  threads=True) running jobs identified by a hashable key, e.g., the
+  content hash of a file and its processing parameters.
+
+  Jobs wait in a single queue, so the number of files processed at once
+  is capped however many users submit them. Submitting a key that is
+  already known returns the same future, so a job runs once no matter how
+  many reruns or sessions ask for it, except if it failed or was
+  cancelled: then it runs again. Finished jobs keep their results up to
+  `keepFinished` jobs and `maxBytes` of results (see resultBytes), the
+  least recently submitted ones are forgotten first. The job just
+  submitted is always kept, even if its result alone is over the budget.
+  '''
+  def __init__(self, maxWorkers=None, threads=False, keepFinished=32, maxBytes=512 * 2**20):
+    self.maxWorkers = maxWorkers or min(4, os.cpu_count() or 1)
+    self.threads = threads
+    self.keepFinished = keepFinished
+    self.maxBytes = maxBytes
+    self._executor = self._newExecutor()
+    self._jobs = OrderedDict()
+    self._sizes = {}
+    self._lock = threading.RLock()
+
+  def _newExecutor(self):
+    if self.threads:
+      return ThreadPoolExecutor(max_workers=self.maxWorkers)
+
+    # Workers are not forked from the (multithreaded) server process itself
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=self.maxWorkers, mp_context=multiprocessing.get_context(method))
+
+  def submit(self, key, fn, *args, **kwargs):
+    '''Queues fn(*args, **kwargs) under `key` unless it is known. Returns its future'''
+    with self._lock:
+      future = self._jobs.get(key)
+      if future is None or self._failed(future):
+        try:
+          future = self._submitWithoutMain(fn, *args, **kwargs)
+        except BrokenProcessPool:
+          # A worker died (e.g., out of memory), start over with new ones
+          self._executor = self._newExecutor()
+          future = self._submitWithoutMain(fn, *args, **kwargs)
+        self._jobs[key] = future
+        self._sizes.pop(key, None)
+        future.add_done_callback(self._onDone)
+
+      self._jobs.move_to_end(key)
+      self._forgetFinished()
+      return future
+
+  def _submitWithoutMain(self, fn, *args, **kwargs):
+    '''
+    Submits to the executor, which starts its workers on the first call.
+    New workers first run the file of sys.modules['__main__']. During a
+    Streamlit script run that is the page (UI included) instead of the
+    script the interpreter was started with, so a bare module stands in
+    for it meanwhile: workers import only what the jobs need.
+    '''
+    main = sys.modules['__main__']
+    mainFile = getattr(main, '__file__', None)
+    if self.threads or mainFile is None or \
+       os.path.abspath(mainFile) == os.path.abspath(sys.argv[0] if sys.argv else ''):
+      return self._executor.submit(fn, *args, **kwargs)
+
+    with self._lock:
+      sys.modules['__main__'] = types.ModuleType('__main__')
+      try:
+        return self._executor.submit(fn, *args, **kwargs)
+      finally:
+        sys.modules['__main__'] = main
+
+  def workerModules(self, names=('streamlit', 'plotly')):
+    '''Which of the modules `names` a worker has imported, e.g., to check that workers stay UI free'''
+    return self._submitWithoutMain(loadedModules, names).result()
+
+  def _onDone(self, future):
+    with self._lock:
+      self._forgetFinished()
+
+  def _resultBytes(self, key):
+    if key not in self._sizes:
+      future = self._jobs[key]
+      self._sizes[key] = 0 if self._failed(future) else resultBytes(future.result())
+    return self._sizes[key]
+
+  def _forgetFinished(self):
+    finished = [k for k, f in self._jobs.items() if f.done()]
+    if not finished:
+      return
+    total = sum(self._resultBytes(k) for k in finished)
+
+    # Oldest first, never the job submitted last
+    last = next(reversed(self._jobs))
+    kept = len(finished)
+    for k in finished:
+      if k == last or (kept <= self.keepFinished and total <= self.maxBytes):
+        break
+      total -= self._resultBytes(k)
+      kept -= 1
+      del self._jobs[k]
+      del self._sizes[k]
+
+  @property
+  def nbytes(self):
+    '''Memory held by the results of the finished jobs'''
+    with self._lock:
+      return sum(self._resultBytes(k) for k, f in self._jobs.items() if f.done())
+
+  @staticmethod
+  def _failed(future):
+    return future.done() and (future.cancelled() or future.exception() is not None)
+
+  def future(self, key):
+    return self._jobs.get(key)
+
+  def failure(self, key):
+    '''Error message of a job that failed or was cancelled, None otherwise'''
+    future = self._jobs.get(key)
+    if future is None or not self._failed(future):
+      return None
+    if future.cancelled():
+      return "the job was cancelled"
+    error = future.exception()
+    return f"{type(error).__name__}: {error}"
+
+  def status(self, key):
+    '''One of unknown, queued, running, done, failed or cancelled'''
+    future = self._jobs.get(key)
+    if future is None:
+      return 'unknown'
+    if future.running():
+      return 'running'
+    if not future.done():
+      return 'queued'
+    if future.cancelled():
+      return 'cancelled'
+    return 'failed' if future.exception() is not None else 'done'
+
+  def pending(self):
+    '''Number of jobs queued or running, from every session'''
+    return sum(not f.done() for f in list(self._jobs.values()))
+
+  def __len__(self):
+    '''Number of jobs known, queued, running or finished'''
+    return len(self._jobs)
+
+  def forget(self, key):
+    with self._lock:
+      self._jobs.pop(key, None)
+      self._sizes.pop(key, None)
+
+  def shutdown(self, wait=True):
+    self._executor.shutdown(wait=wait, cancel_futures=True)
+
+def resultBytes(result):
+  '''
+  Approximate memory held by a job result: the data of arrays, pandas
+  objects and of the tuples, lists and dicts holding them.
+  '''
+  if isinstance(result, (tuple, list)):
+    return sum(resultBytes(r) for r in result)
+  if isinstance(result, dict):
+    return sum(resultBytes(r) for r in result.values())
+  if hasattr(result, 'memory_usage'):
+    usage = result.memory_usage(index=True)
+    return int(getattr(usage, 'sum', lambda: usage)())
+  if hasattr(result, 'nbytes'):
+    return int(result.nbytes)
+  return sys.getsizeof(result)
+
+def loadedModules(names):
+  '''Which of the modules `names` are imported in this process'''
+  return [m for m in names if m in sys.modules]
+
+## Pool shared by the pages of a server, see sharedPool
+_sharedPool = None
+_sharedLock = threading.Lock()
+
+def sharedPool():
+  '''
+  The JobPool shared by every session of this server, created on first
+  use. Its number of workers is taken from the ADV_WORKERS environment
+  variable, by default min(4, number of CPUs), and the memory kept for
+  finished results from ADV_CACHE_MB, by default 512.
+  '''
+  global _sharedPool
+  with _sharedLock:
+    if _sharedPool is None:
+      workers = os.environ.get("ADV_WORKERS")
+      cacheMB = float(os.environ.get("ADV_CACHE_MB", 512))
+      _sharedPool = JobPool(int(workers) if workers else None, maxBytes=int(cacheMB * 2**20))
+    return _sharedPool
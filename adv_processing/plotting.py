@@ -0,0 +1,37 @@
+'''
+Reduction of long records before they are sent to a plot. No plotting
+library is imported here.
+'''
+import numpy as np
+
+def minMaxDownsample(x, y, maxPoints=4000):
+  '''
+  Reduces a series to at most `maxPoints` samples that keep its visible
+  shape: the record is split in maxPoints/2 buckets and the minimum and
+  maximum of each bucket are kept, in their original order.
+  Series within the budget are returned as they are, longer ones need
+  maxPoints >= 2. Returns (x, y)
+  '''
+  x, y = np.asarray(x), np.asarray(y)
+  n = len(y)
+
+  if n <= maxPoints:
+    return x, y
+  if maxPoints < 2:
+    raise ValueError(f"maxPoints must be at least 2 to keep a minimum and a maximum, got {maxPoints}")
+
+  bucket = -(-n // (maxPoints // 2))
+  nFull = n // bucket
+
+  # Extrema of all the full buckets at once
+  blocks = y[:nFull*bucket].reshape(nFull, bucket)
+  offsets = np.arange(nFull) * bucket
+  keep = [offsets + blocks.argmin(axis=1), offsets + blocks.argmax(axis=1)]
+
+  # and of the remaining tail
+  if nFull*bucket < n:
+    tail = y[nFull*bucket:]
+    keep.append([nFull*bucket + tail.argmin(), nFull*bucket + tail.argmax()])
+
+  idx = np.unique(np.concatenate(keep))
+  return x[idx], y[idx]
@@ -0,0 +1,207 @@
+'''
+Summaries of single files and velocity profiles from a set of them.
+'''
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from .reader import readFile, readBuffer
+from .statistics import VELOCITY_COLUMNS, CORRELATION_COLUMNS, SNR_COLUMNS, qualityMask, \
+  despikeFrame, reynoldsStats, blockBootstrap
+from .spectra import samplingRate, autocorrelation, integralTimeScale, effectiveSamples
+from .conversion import findFiles
+
+def assembleSummary(bottomDistance, probeDist, stats, rejected=0.0, boot=None):
+  '''
+  Summary of a file from its already computed pieces: the elevation z,
+  zStd from the bottom distance minus the probe distance `probeDist` [m],
+  the means, u'ᵢu'ⱼ and tke of reynoldsStats `stats` and the fraction of
+  `rejected` pings. The intervals of blockBootstrap `boot`, if given, are
+  added with Low and High suffixes. Keys as in fileSummary.
+  '''
+  samplePositionZ = np.asarray(bottomDistance) - probeDist
+  summary = {'z':float(samplePositionZ.mean()), 'zStd':float(samplePositionZ.std(ddof=1))}
+  summary.update(zip('uvw', np.asarray(stats['mean']).tolist()))
+  summary.update(stats['components'])
+  summary['tke'] = stats['tke']
+  summary['rejected'] = rejected
+
+  if boot is not None:
+    intervals = dict(zip('uvw', boot['mean']), **boot['components'], tke=boot['tke'])
+    for name, (low, high) in intervals.items():
+      summary[name+'Low'], summary[name+'High'] = float(low), float(high)
+
+  return summary
+
+def fileSummary(source, probeDist=0.05, columns=VELOCITY_COLUMNS, despike=True, minCorrelation=70.0, minSNR=15.0, nBoot=1000):
+  '''
+  Summarizes a single Vectrino file, given as a path or as the bytes of
+  an upload. The elevation is the mean of SamplePositionZ, the bottom
+  distance minus the probe distance `probeDist` [m]. Pings below the
+  quality thresholds are left out (see qualityMask) and velocities are
+  despiked first unless `despike=False`. Returns a dict with z, zStd,
+  the mean velocities u, v, w, the six u'ᵢu'ⱼ, the tke, the fraction
+  of rejected pings, and the integral time scales Tu, Tv, Tw [s] with
+  the effective number of independent samples nEffU, nEffV, nEffW.
+  The 95% block-bootstrap intervals of the means, u'ᵢu'ⱼ and tke are
+  added with Low and High suffixes (e.g., uLow, uHigh) unless nBoot=0.
+  '''
+  read = readBuffer if isinstance(source, (bytes, bytearray, memoryview)) else readFile
+  prof, bott = read(source, columns={'Profiles':['time']+list(columns)+CORRELATION_COLUMNS+SNR_COLUMNS,
+                                     'BottomCheck':['time','BottomDistance']})
+
+  valid, quality = qualityMask(prof, minCorrelation, minSNR)
+  if despike:
+    prof, _ = despikeFrame(prof, columns, valid=valid)
+
+  stats = reynoldsStats(prof, columns, mask=valid)
+  dt = 1/samplingRate(prof['time'])
+  timeScales = integralTimeScale(autocorrelation(prof[list(columns)].to_numpy().T), dt)
+
+  boot = None
+  if nBoot:
+    boot = blockBootstrap(prof[list(columns)], np.ceil(2*timeScales.max()/dt), nBoot, mask=valid)
+
+  summary = assembleSummary(bott['BottomDistance'], probeDist, stats, quality['rejected'], boot)
+  summary.update(zip(['Tu','Tv','Tw'], timeScales.tolist()))
+  summary.update(zip(['nEffU','nEffV','nEffW'], effectiveSamples(stats['n'], dt, timeScales).tolist()))
+
+  return summary
+
+def buildProfile(sources, probeDist=0.05, workers=None, despike=True, nBoot=1000):
+  '''
+  Summarizes a set of Vectrino files concurrently, one per worker process,
+  and assembles them as a velocity profile: a dataframe with a row per
+  file sorted by elevation. `sources` is a list of paths or a dict
+  {name: path or bytes}. The bootstrap intervals of each file (see
+  fileSummary) are computed in its worker.
+  '''
+  if not isinstance(sources, dict):
+    sources = {str(s):s for s in sources}
+
+  if workers == 1 or len(sources) <= 1:
+    summaries = [fileSummary(s, probeDist, despike=despike, nBoot=nBoot) for s in sources.values()]
+  else:
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+      summaries = list(pool.map(fileSummary, sources.values(), repeat(probeDist),
+                                repeat(VELOCITY_COLUMNS), repeat(despike),
+                                repeat(70.0), repeat(15.0), repeat(nBoot)))
+
+  profile = pd.DataFrame(summaries, index=pd.Index(list(sources), name='file'))
+  return profile.sort_values('z', kind='stable').reset_index()
+
+def summarizeFile(srcDir, relPath, probeDist=0.05, despike=True, nBoot=1000):
+  '''
+  fileSummary of a file of a campaign folder as a record with its relative
+  path and folder (e.g., morning-data/trough), status and processing time.
+  Errors are recorded in the record instead of raised.
+  '''
+  start = time.perf_counter()
+  record = {'file':relPath, 'folder':os.path.dirname(relPath)}
+
+  try:
+    record.update(fileSummary(os.path.join(srcDir,relPath), probeDist, despike=despike, nBoot=nBoot))
+    record['status'] = 'processed'
+  except Exception as e:
+    record.update(status='failed', error=f"{type(e).__name__}: {e}")
+
+  record['seconds'] = time.perf_counter() - start
+  return record
+
+def summarizeFolder(srcDir, probeDist=0.05, workers=None, despike=True, nBoot=1000, progress=None):
+  '''
+  Summarizes every .nc file under srcDir (a whole campaign like Lab1-2022,
+  or one of its folders like Lab1-2022/morning-data/trough), one file per
+  worker process. `progress`, if given, is called with each record as it
+  finishes. Returns (dataframe with a row per file sorted by path, dict
+  with the timing of the run).
+  '''
+  start = time.perf_counter()
+  files = findFiles(srcDir)
+  options = dict(probeDist=probeDist, despike=despike, nBoot=nBoot)
+
+  records = []
+  if workers == 1 or len(files) <= 1:
+    for f in files:
+      records.append(summarizeFile(srcDir, f, **options))
+      if progress is not None:
+        progress(records[-1])
+  else:
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+      futures = [pool.submit(summarizeFile, srcDir, f, **options) for f in files]
+      for future in as_completed(futures):
+        records.append(future.result())
+        if progress is not None:
+          progress(records[-1])
+
+  elapsed = time.perf_counter() - start
+
+  # Bookkeeping columns go last, whichever record came first
+  summary = pd.DataFrame(records, columns=None if records else ['file','folder','status','seconds'])
+  last = [c for c in ('status','seconds','error') if c in summary]
+  summary = summary[[c for c in summary if c not in last] + last]
+  summary = summary.sort_values('file', kind='stable').reset_index(drop=True)
+
+  seconds = summary['seconds'].to_numpy(dtype=np.float64)
+  timing = {
+    'files'          : len(summary),
+    'processed'      : int((summary['status'] == 'processed').sum()),
+    'failed'         : int((summary['status'] == 'failed').sum()),
+    'workers'        : 1 if workers == 1 or len(files) <= 1 else (workers or os.cpu_count()),
+    'wallSeconds'    : elapsed,
+    'fileSeconds'    : {
+      'total'  : float(seconds.sum()),
+      'mean'   : float(seconds.mean()) if len(seconds) else 0.0,
+      'median' : float(np.median(seconds)) if len(seconds) else 0.0,
+      'max'    : float(seconds.max()) if len(seconds) else 0.0
+    },
+    'filesPerSecond' : len(summary) / elapsed if elapsed > 0 else 0.0
+  }
+  return summary, timing
+
+def fitLogLaw(y, u, d, window=(0.0, 1.0), nBoot=2000, confidence=0.95, seed=None):
+  '''
+  Least-squares fit of the log-law u = A + B (1 + ln(y/d)) to a velocity
+  profile, using the points with y/d inside `window`. The fit is the
+  closed-form linear regression of u on ln y.
+
+  The confidence intervals of A and B come from a bootstrap of the fitted
+  points: all the `nBoot` resamples are drawn as one index matrix and fit
+  at once. Returns a dict with A, B, their intervals ciA, ciB, the r2 of
+  the fit and the number n of points used.
+  '''
+  y, u = np.asarray(y, dtype=np.float64), np.asarray(u, dtype=np.float64)
+  inside = (y > 0) & (y/d >= window[0]) & (y/d <= window[1])
+  x, u = 1 + np.log(y[inside]/d), u[inside]
+  n = len(x)
+
+  if len(np.unique(x)) < 2:
+    raise ValueError(f"At least two elevations are needed within y/d = {window}, found {len(np.unique(x))}")
+
+  def regression(x, u):
+    xc = x - x.mean(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+      B = (xc * u).sum(axis=-1) / (xc**2).sum(axis=-1)
+    return u.mean(axis=-1) - B * x.mean(axis=-1), B
+
+  A, B = regression(x, u)
+  residual = u - A - B*x
+  r2 = 1 - (residual**2).sum() / ((u - u.mean())**2).sum()
+
+  # Every bootstrap resample at once, degenerate ones (a single x) are NaN
+  idx = np.random.default_rng(seed).integers(0, n, size=(nBoot, n))
+  bootA, bootB = regression(x[idx], u[idx])
+  q = [(1 - confidence)/2, (1 + confidence)/2]
+
+  return {
+    'A'   : float(A),
+    'B'   : float(B),
+    'ciA' : np.nanquantile(bootA, q),
+    'ciB' : np.nanquantile(bootB, q),
+    'r2'  : float(r2),
+    'n'   : n
+  }
@@ -0,0 +1,263 @@
+'''
+Reading of the netCDF files exported by the Vectrino software into pandas.
+'''
+import numpy as np
+import pandas as pd
+
+## Variables actually used by the lab analysis
+USED_COLUMNS = {
+  'Profiles'    : ['time','VelocityX','VelocityY','VelocityZ1','VelocityZ2'],
+  'BottomCheck' : ['time','BottomDistance']
+}
+
+## Host clock variables, which lose their resolution in single precision
+ABSOLUTE_TIME_COLUMNS = ('HostTime','HostTimeMatlab')
+
+def timeVariables(group):
+  '''
+  Names of the variables in a netCDF group that share the shape of its
+  `time` variable. Only the metadata is inspected, no data is read.
+  '''
+  shapeTime = group.variables['time'].shape
+  return [k for k,v in group.variables.items() if v.shape == shapeTime]
+
+def selectColumns(group, groupName, columns=None):
+  '''
+  Returns the time-shaped variables of a group to be read.
+
+  `columns` can be None (all of them), a list of names (kept for every
+  group in which they exist) or a dict {groupName: list of names}
+  '''
+  names = timeVariables(group)
+
+  if columns is None:
+    return names
+
+  if isinstance(columns, dict):
+    wanted = columns.get(groupName)
+    if wanted is None:
+      return names
+    missing = [k for k in wanted if k not in names]
+    if missing:
+      raise KeyError(f"{missing} not found in group '{groupName}'")
+  else:
+    wanted = columns
+
+  return [k for k in names if k in wanted]
+
+def groupToDataFrame(group, names=None, dtype=None, start=None, stop=None):
+  '''
+  Reads the variables `names` (by default all time-shaped ones) of a
+  netCDF group into a pandas dataframe. Only the samples between `start`
+  and `stop` are read if given.
+
+  Variables are read straight into one preallocated block per dtype, and
+  the dataframe columns are views of those blocks, so only one copy of
+  the data is kept. With `dtype` (e.g., np.float32) every column is cast
+  on read, except the absolute host clocks that stay as float64.
+  '''
+  names = timeVariables(group) if names is None else list(names)
+  window = slice(start, stop)
+  n = len(range(*window.indices(group.variables['time'].shape[0])))
+
+  # Target dtype of each column
+  targets = {}
+  for k in names:
+    if dtype is None or k in ABSOLUTE_TIME_COLUMNS:
+      targets[k] = group.variables[k].dtype
+    else:
+      targets[k] = np.dtype(dtype)
+
+  # One contiguous block per dtype, a row for each column
+  blocks = {}
+  for dt in set(targets.values()):
+    members = [k for k in names if targets[k] == dt]
+    blocks[dt] = (np.empty((len(members), n), dtype=dt), members)
+
+  # Skip the masked array conversion, fill values are kept as in np.array
+  group.set_auto_mask(False)
+
+  columns = {}
+  for block, members in blocks.values():
+    for i,k in enumerate(members):
+      block[i] = group.variables[k][window]
+      columns[k] = block[i]
+
+  return pd.DataFrame({k:columns[k] for k in names}, copy=False)
+
+class SharedDataset:
+  '''
+  Open netCDF4.Dataset shared by several LazyGroup. Each of them holds a
+  reference, and the file is closed when the last one is released.
+  '''
+  def __init__(self, dataset):
+    self.dataset = dataset
+    self.references = 0
+
+  def acquire(self):
+    self.references += 1
+    return self.dataset
+
+  def release(self):
+    self.references -= 1
+    if self.references <= 0 and self.dataset.isopen():
+      self.dataset.close()
+
+class LazyGroup:
+  '''
+  Read-only, dict-like view of a netCDF group. Each variable is read
+  from the file the first time it is accessed and kept afterwards, cast
+  to `dtype` if given (see groupToDataFrame).
+
+  `dataset` is an open netCDF4.Dataset, or a SharedDataset when several
+  groups of a file are viewed at once: the file is closed when every
+  group viewing it is closed. Works as a context manager that closes the
+  group on exit.
+  '''
+  def __init__(self, dataset, groupName, columns=None, dtype=None):
+    self._shared = dataset if isinstance(dataset, SharedDataset) else SharedDataset(dataset)
+    self._dataset = self._shared.acquire()
+    self._closed = False
+    self._cache = {}
+    self.name = groupName
+    self.dtype = dtype
+
+    try:
+      self._group = self._dataset['Data'][groupName]
+      self.columns = selectColumns(self._group, groupName, columns)
+    except BaseException:
+      self.close()
+      raise
+
+  def __getitem__(self, key):
+    if key not in self.columns:
+      raise KeyError(key)
+    if key not in self._cache:
+      values = np.array(self._group[key])
+      if self.dtype is not None and key not in ABSOLUTE_TIME_COLUMNS:
+        values = values.astype(self.dtype, copy=False)
+      self._cache[key] = values
+    return self._cache[key]
+
+  def __contains__(self, key):
+    return key in self.columns
+
+  def __iter__(self):
+    return iter(self.columns)
+
+  def __len__(self):
+    return len(self.columns)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def keys(self):
+    return list(self.columns)
+
+  def toDataFrame(self, columns=None):
+    '''
+    Builds a pandas dataframe with the requested (or all the selected)
+    columns, reading only those not accessed before.
+    '''
+    columns = self.columns if columns is None else columns
+    return pd.DataFrame({k:self[k] for k in columns})
+
+  def close(self):
+    '''
+    Releases the file, which is closed once no other group of it is
+    open. Variables already read are kept.
+    '''
+    if not self._closed:
+      self._closed = True
+      self._shared.release()
+
+def readFile(filePath, columns=None, groups=('Profiles','BottomCheck'), lazy=False, dtype=None):
+  '''
+  Reads a netCDF Vectrino file and returns its contents as one pandas
+  dataframe per group, by default (profiles, bottom check).
+
+  `columns` restricts the variables that are read, either as a list of
+  names or as a dict {groupName: list of names}; e.g., USED_COLUMNS.
+  With `lazy=True`, a LazyGroup is returned per group instead, and the
+  file stays open until all of them are closed.
+  `dtype` sets the precision of the columns, see groupToDataFrame.
+  '''
+  import netCDF4
+
+  f = netCDF4.Dataset(filePath)
+
+  if lazy:
+    shared = SharedDataset(f)
+    views = []
+    try:
+      for g in groups:
+        views.append(LazyGroup(shared, g, columns, dtype))
+    except BaseException:
+      for v in views:
+        v.close()
+      if f.isopen():
+        f.close()
+      raise
+    return tuple(views)
+
+  try:
+    return readDataset(f, columns, groups, dtype)
+  finally:
+    f.close()
+
+def readBuffer(buffer, columns=None, groups=('Profiles','BottomCheck'), dtype=None):
+  '''
+  Same as readFile, for a Vectrino file already in memory (e.g., the
+  bytes of a Streamlit upload). The in-memory dataset is opened once and
+  closed as soon as the arrays are extracted, no temporary file is used.
+  '''
+  import netCDF4
+
+  f = netCDF4.Dataset("inmemory.nc", memory=buffer)
+
+  try:
+    return readDataset(f, columns, groups, dtype)
+  finally:
+    f.close()
+
+def readDataset(f, columns=None, groups=('Profiles','BottomCheck'), dtype=None):
+  '''
+  Organizes each group of an open netCDF4.Dataset in its own pandas
+  dataframe. The dataset is not closed.
+  '''
+  frames = []
+  for g in groups:
+    data = f['Data'][g]
+    frames.append(groupToDataFrame(data, selectColumns(data, g, columns), dtype))
+
+  return tuple(frames)
+
+def iterChunks(source, chunkSize=60000, columns=None, group='Profiles', dtype=None):
+  '''
+  Yields the time-shaped variables of a group as dataframes of (at most)
+  chunkSize samples, slicing the netCDF variables directly so the whole
+  record is never held in memory. The index of each chunk continues the
+  previous one. `source` is a file path or an open netCDF4.Dataset, and
+  `columns` and `dtype` work as in readFile.
+  '''
+  import netCDF4
+
+  f = source if isinstance(source, netCDF4.Dataset) else netCDF4.Dataset(source)
+
+  try:
+    data = f['Data'][group]
+    names = selectColumns(data, group, columns)
+    n = data.variables['time'].shape[0]
+
+    for start in range(0, n, chunkSize):
+      stop = min(start + chunkSize, n)
+      chunk = groupToDataFrame(data, names, dtype, start, stop)
+      chunk.index = pd.RangeIndex(start, stop)
+      yield chunk
+
+  finally:
+    if f is not source:
+      f.close()
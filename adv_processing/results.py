@@ -0,0 +1,116 @@
+'''
+Per-file results of a session, kept as one preallocated structured array.
+'''
+import numpy as np
+
+## Quantities kept for every file. Missing ones are stored as NaN
+RESULT_FIELDS = ('z', 'zStd', 'u', 'v', 'w', 'uu', 'uv', 'uw', 'vv', 'vw', 'ww', 'tke',
+                 'rejected', 'uLow', 'uHigh', 'vLow', 'vHigh', 'wLow', 'wHigh', 'tkeLow', 'tkeHigh')
+
+class ResultsStore:
+  '''
+  Results of up to `capacity` files keyed by the content hash of each
+  file: elevation, means, u'ᵢu'ⱼ, tke, rejected fraction of pings and
+  bootstrap intervals (see RESULT_FIELDS and fileSummary).
+
+  Rows live in a single float64 structured array allocated once, so the
+  memory used does not grow with the files added; once full, the file
+  added or updated least recently is replaced, unless room is made first
+  with reserve(). A field of every stored file is read at once with
+  store['u'], in the order the files were stored or last updated, and
+  toFrame() gives the whole table sorted by elevation.
+  '''
+  def __init__(self, capacity=64):
+    self.capacity = capacity
+    self._rows = np.full(capacity, np.nan, dtype=[(f, np.float64) for f in RESULT_FIELDS])
+    self._names = [None] * capacity
+    self._index = {}
+
+  def add(self, key, name, summary):
+    '''
+    Stores the results of a file, e.g., a fileSummary dict or a row of
+    buildProfile. Fields not in RESULT_FIELDS are ignored. Returns the
+    key of the file replaced to make room, if any.
+    '''
+    evicted = None
+    if key in self._index:
+      row = self._index.pop(key)
+    elif len(self._index) < self.capacity:
+      row = min(set(range(self.capacity)) - set(self._index.values()))
+    else:
+      evicted = next(iter(self._index))
+      row = self._index.pop(evicted)
+
+    self._index[key] = row
+    self._names[row] = name
+    self._rows[row] = tuple(float(summary.get(f, np.nan)) for f in RESULT_FIELDS)
+    return evicted
+
+  def reserve(self, capacity):
+    '''
+    Grows the store to hold at least `capacity` files, e.g., every file
+    of an upload, keeping the files stored. It never shrinks.
+    '''
+    if capacity > self.capacity:
+      rows = np.full(capacity, np.nan, dtype=self._rows.dtype)
+      rows[:self.capacity] = self._rows
+      self._rows = rows
+      self._names += [None] * (capacity - self.capacity)
+      self.capacity = capacity
+
+  def update(self, key, **fields):
+    '''Overwrites some fields of a stored file, e.g., update(key, z=0.02)'''
+    # Moved last, so it is replaced after the files not updated since
+    row = self._index[key] = self._index.pop(key)
+    for f, value in fields.items():
+      self._rows[f][row] = value
+
+  def get(self, key):
+    '''Results of a stored file as a dict, with its name'''
+    row = self._index[key]
+    return dict(zip(RESULT_FIELDS, self._rows[row].tolist()), name=self._names[row])
+
+  def remove(self, key):
+    row = self._index.pop(key)
+    self._rows[row] = np.nan
+    self._names[row] = None
+
+  def clear(self):
+    self._rows[:] = np.nan
+    self._names = [None] * self.capacity
+    self._index.clear()
+
+  def keys(self):
+    return list(self._index)
+
+  def names(self):
+    return [self._names[row] for row in self._index.values()]
+
+  def __getitem__(self, field):
+    return self._rows[field][list(self._index.values())]
+
+  def __contains__(self, key):
+    return key in self._index
+
+  def __iter__(self):
+    return iter(self._index)
+
+  def __len__(self):
+    return len(self._index)
+
+  @property
+  def nbytes(self):
+    return self._rows.nbytes
+
+  def toFrame(self):
+    '''
+    Dataframe with a row per stored file sorted by elevation, with the
+    file name and key as the first columns
+    '''
+    import pandas as pd
+
+    rows = list(self._index.values())
+    frame = pd.DataFrame(self._rows[rows])
+    frame.insert(0, 'key', self.keys())
+    frame.insert(0, 'file', self.names())
+    return frame.sort_values('z', kind='stable').reset_index(drop=True)
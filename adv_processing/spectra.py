@@ -0,0 +1,123 @@
+'''
+Spectra, autocorrelation and integral time scales of velocity records.
+'''
+import numpy as np
+
+def samplingRate(time):
+  '''Sampling frequency [Hz] of a record from its time column [s]'''
+  return 1/np.median(np.diff(np.asarray(time, dtype=np.float64)))
+
+def welchPSD(records, fs, nperseg=256, overlap=0.5):
+  '''
+  Welch power spectral densities (Hann window, mean removed from each
+  segment, one-sided) of one or many records.
+
+  `records` is an array whose last axis is time, e.g., the 3×N velocity
+  components of a file, or a list of such arrays of different lengths,
+  e.g., one per file. The segments of every series are stacked and
+  transformed in a single batched FFT, then averaged per series.
+  Returns (frequencies, PSD) where the PSD has the shape of the records
+  with the time axis replaced by frequency (a list for a list input).
+  '''
+  single = not isinstance(records, (list, tuple))
+  records = [records] if single else records
+
+  step = max(1, int(nperseg*(1 - overlap)))
+  window = 0.5 - 0.5*np.cos(2*np.pi*np.arange(nperseg)/nperseg)
+
+  segments, counts, shapes = [], [], []
+  for record in records:
+    record = np.asarray(record, dtype=np.float64)
+    shapes.append(record.shape[:-1])
+    for series in record.reshape(-1, record.shape[-1]):
+      windows = np.lib.stride_tricks.sliding_window_view(series, nperseg)[::step]
+      segments.append(windows)
+      counts.append(len(windows))
+
+  segments = np.concatenate(segments)
+  segments = (segments - segments.mean(axis=1, keepdims=True)) * window
+  power = np.abs(np.fft.rfft(segments, axis=1))**2 / (fs * (window**2).sum())
+  power[:,1:] *= 2
+  if nperseg % 2 == 0:
+    power[:,-1] /= 2
+
+  # Average the segments of each series
+  starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+  psd = np.add.reduceat(power, starts, axis=0) / np.array(counts)[:,None]
+
+  frequencies = np.fft.rfftfreq(nperseg, 1/fs)
+  sizes = [int(np.prod(shape)) for shape in shapes]
+  splits = np.split(psd, np.cumsum(sizes)[:-1])
+  psds = [p.reshape(shape + (len(frequencies),)) for p,shape in zip(splits, shapes)]
+
+  return frequencies, (psds[0] if single else psds)
+
+def inertialSlope(frequencies, psd, fmin, fmax):
+  '''
+  Least-squares slope and intercept of log10(PSD) against log10(f) in the
+  band [fmin, fmax], for every series in the PSD array at once. In the
+  inertial subrange the slope should approach -5/3.
+  '''
+  band = (frequencies >= fmin) & (frequencies <= fmax) & (frequencies > 0)
+  x = np.log10(frequencies[band])
+  y = np.log10(psd[...,band])
+
+  xc = x - x.mean()
+  slope = (y * xc).sum(axis=-1) / (xc**2).sum()
+  intercept = y.mean(axis=-1) - slope * x.mean()
+  return slope, intercept
+
+def logBin(frequencies, psd, nBins=100):
+  '''
+  Averages a spectrum in logarithmically spaced frequency bins, so a plot
+  needs a few hundred points instead of the full frequency grid. Works
+  on every series of the PSD array at once; empty bins are dropped.
+  Returns (bin mean frequencies, binned PSD)
+  '''
+  positive = frequencies > 0
+  f, p = frequencies[positive], psd[...,positive]
+
+  edges = np.geomspace(f[0], f[-1], nBins + 1)
+  starts = np.unique(np.searchsorted(f, edges[:-1]))
+  starts = starts[starts < len(f)]
+  counts = np.diff(np.append(starts, len(f)))
+
+  return np.add.reduceat(f, starts) / counts, np.add.reduceat(p, starts, axis=-1) / counts
+
+def autocorrelation(x, maxLag=None):
+  '''
+  Autocorrelation function ρ(τ) of the fluctuations of one or many series
+  (time along the last axis), normalized so that ρ(0) = 1. Computed in
+  O(N log N) with a zero-padded FFT, which avoids the circular wrap-around.
+  Lags up to `maxLag` samples (by default all of them) are returned.
+  '''
+  x = np.asarray(x, dtype=np.float64)
+  n = x.shape[-1]
+
+  fluct = x - x.mean(axis=-1, keepdims=True)
+  nfft = 1 << (2*n - 1).bit_length()
+  spectrum = np.fft.rfft(fluct, nfft, axis=-1)
+  acf = np.fft.irfft(spectrum * np.conj(spectrum), nfft, axis=-1)[...,:n]
+
+  return (acf / acf[...,:1])[...,:maxLag]
+
+def integralTimeScale(acf, dt):
+  '''
+  Integral time scale of each autocorrelation function, the trapezoidal
+  integral of ρ(τ) up to its first zero crossing. `dt` is the sampling
+  interval [s].
+  '''
+  acf = np.asarray(acf)
+  below = acf <= 0
+  first = np.where(below.any(axis=-1), below.argmax(axis=-1), acf.shape[-1])
+
+  inside = np.arange(acf.shape[-1]) < first[...,None]
+  last = np.take_along_axis(acf, (first - 1)[...,None], axis=-1)[...,0]
+  return dt * ((acf * inside).sum(axis=-1) - 0.5*(acf[...,0] + last))
+
+def effectiveSamples(n, dt, timeScale):
+  '''
+  Number of independent samples in a record of n samples, N·Δt / (2T),
+  capped to n. The standard error of the mean is then σ/√Nₑ.
+  '''
+  return np.minimum(n, n * dt / (2*np.asarray(timeScale)))
@@ -0,0 +1,267 @@
+'''
+Turbulence statistics, quality control, despiking and uncertainty of
+velocity records.
+'''
+import numpy as np
+import pandas as pd
+
+## TURBULENCE STATISTICS
+
+## Velocity components (u, v, w) used for the turbulence statistics
+VELOCITY_COLUMNS = ['VelocityX','VelocityY','VelocityZ1']
+
+## Density of water [kg/m³]
+RHO_WATER = 1000.0
+
+class VelocityMoments:
+  '''
+  Streaming mean, variance and cross-covariance of velocity components.
+
+  Chunks of samples are added with update() and accumulators of other
+  chunks or workers are combined with merge(). Both use the pairwise
+  update of Chan et al., so the result does not depend on how the
+  record was split and matches a single pass over the whole of it.
+  '''
+  def __init__(self, nComponents=3):
+    self.n = 0
+    self.mean = np.zeros(nComponents)
+    self.comoment = np.zeros((nComponents, nComponents))
+
+  def _combine(self, n, mean, comoment):
+    if n == 0:
+      return self
+    total = self.n + n
+    delta = mean - self.mean
+    self.comoment = self.comoment + comoment + np.outer(delta, delta) * self.n * n / total
+    self.mean = self.mean + delta * n / total
+    self.n = total
+    return self
+
+  def update(self, x, mask=None):
+    '''
+    Adds a chunk of samples, an N×components array or dataframe. Only
+    the rows where the boolean `mask` is True are used, if given.
+    '''
+    x = np.asarray(x, dtype=np.float64).reshape(-1, len(self.mean))
+    if mask is not None:
+      x = x[np.asarray(mask)]
+    if len(x) == 0:
+      return self
+    mean = x.mean(axis=0)
+    fluct = x - mean
+    return self._combine(len(x), mean, fluct.T @ fluct)
+
+  def merge(self, other):
+    '''Adds the samples accumulated by another VelocityMoments'''
+    return self._combine(other.n, other.mean, other.comoment)
+
+  def covariance(self, ddof=0):
+    '''Covariance matrix, by default the mean products of the fluctuations'''
+    return self.comoment / (self.n - ddof)
+
+  def variance(self, ddof=1):
+    return np.diag(self.comoment) / (self.n - ddof)
+
+  def std(self, ddof=1):
+    return np.sqrt(self.variance(ddof))
+
+  @classmethod
+  def fromChunks(cls, chunks, columns=VELOCITY_COLUMNS):
+    '''Accumulates `columns` over a stream of dataframes (e.g., from iterChunks)'''
+    moments = cls(len(columns))
+    for chunk in chunks:
+      moments.update(chunk[columns])
+    return moments
+
+def reynoldsStats(vels, columns=VELOCITY_COLUMNS, rho=RHO_WATER, mask=None):
+  '''
+  Reynolds decomposition of a velocity record (e.g., the profiles
+  dataframe from readFile) in a single covariance pass over its N×3
+  velocity matrix, using only the samples where `mask` is True if given
+  (e.g., from qualityMask). See reynoldsFromMoments for the returned dict.
+  '''
+  return reynoldsFromMoments(VelocityMoments(len(columns)).update(vels[columns], mask), rho)
+
+def reynoldsFromMoments(moments, rho=RHO_WATER):
+  '''
+  Reynolds decomposition from accumulated VelocityMoments, e.g., of a
+  chunked record or merged from several workers. Returns a dict with
+    - n          : number of samples
+    - mean       : mean velocities (ū, v̄, w̄)
+    - covariance : 3×3 matrix of the mean products of fluctuations u'ᵢu'ⱼ
+    - stress     : Reynolds stress tensor τ'ᵢⱼ = -ρ u'ᵢu'ⱼ
+    - components : the six distinct u'ᵢu'ⱼ, keyed as uu, vv, ww, uv, uw, vw
+    - tke        : turbulent kinetic energy k = ½ (u'u' + v'v' + w'w')
+  '''
+  covariance = moments.covariance()
+
+  names = 'uvw'
+  components = {names[i]+names[j]:float(covariance[i,j]) \
+                for i in range(3) for j in range(i,3)}
+
+  return {
+    'n'          : moments.n,
+    'mean'       : moments.mean,
+    'covariance' : covariance,
+    'stress'     : -rho * covariance,
+    'components' : components,
+    'tke'        : 0.5 * float(np.trace(covariance))
+  }
+
+def chunkedMeanStd(chunks, columns):
+  '''
+  Mean and sample standard deviation of `columns` over a stream of
+  dataframes (e.g., from iterChunks). The moments of each chunk are
+  combined pairwise, so only one chunk is in memory at a time.
+  '''
+  moments = VelocityMoments.fromChunks(chunks, columns)
+  return pd.DataFrame({'mean':moments.mean, 'std':moments.std()}, index=columns)
+
+## QUALITY CONTROL
+
+## Diagnostics recorded for each of the four beams in the Profiles group
+CORRELATION_COLUMNS = [f'CorrelationBeam{i}' for i in range(1,5)]
+SNR_COLUMNS = [f'SNRBeam{i}' for i in range(1,5)]
+
+def qualityMask(vels, minCorrelation=70.0, minSNR=15.0):
+  '''
+  Flags the pings with a correlation [%] or a signal-to-noise ratio [dB]
+  below the thresholds in any of the beams, comparing all the beams and
+  samples at once. Returns (boolean array, True for the valid samples;
+  dict with the rejected fraction in total, by criterion and by beam)
+  '''
+  goodCorrelation = vels[CORRELATION_COLUMNS].to_numpy() >= minCorrelation
+  goodSNR = vels[SNR_COLUMNS].to_numpy() >= minSNR
+  valid = goodCorrelation.all(axis=1) & goodSNR.all(axis=1)
+
+  beamRejected = 1 - (goodCorrelation & goodSNR).mean(axis=0)
+  report = {
+    'rejected'    : float(1 - valid.mean()),
+    'correlation' : float(1 - goodCorrelation.all(axis=1).mean()),
+    'snr'         : float(1 - goodSNR.all(axis=1).mean()),
+    'beams'       : {f'Beam{i}':float(r) for i,r in enumerate(beamRejected, start=1)}
+  }
+  return valid, report
+
+## DESPIKING
+
+def phaseSpaceDespike(x, maxIter=20, valid=None):
+  '''
+  Goring & Nikora (2002) phase-space thresholding of velocity records.
+  `x` is an N-sample series or an N×components array, whose columns are
+  processed together.
+
+  In each iteration the fluctuations, their first and second differences
+  and the universal threshold λ = √(2 ln N) define three ellipses; samples
+  outside any of them are spikes and are replaced by linear interpolation
+  between the remaining samples. Iterations stop once no new spikes are
+  found. Samples not `valid` (e.g., from qualityMask) are replaced before
+  the first iteration, so they do not bias the thresholds.
+  Returns (despiked array, boolean array of the replaced samples).
+  '''
+  x = np.array(x, dtype=np.float64)
+  squeeze = x.ndim == 1
+  x = x.reshape(len(x), -1)
+  n = len(x)
+
+  spikes = np.zeros(x.shape, dtype=bool)
+  index = np.arange(n)
+  lam = np.sqrt(2*np.log(n))
+
+  if valid is not None and not np.all(valid):
+    spikes[~np.asarray(valid)] = True
+    for j in range(x.shape[1]):
+      x[~valid,j] = np.interp(index[~valid], index[valid], x[valid,j])
+
+  for _ in range(maxIter):
+    u = x - x.mean(axis=0)
+    du = np.gradient(u, axis=0)
+    d2u = np.gradient(du, axis=0)
+    su, sdu, sd2u = u.std(axis=0), du.std(axis=0), d2u.std(axis=0)
+
+    # Principal axis of the u - Δ²u cloud and the axes of its ellipse
+    theta = np.arctan((u*d2u).sum(axis=0) / (u**2).sum(axis=0))
+    cos2, sin2 = np.cos(theta)**2, np.sin(theta)**2
+    a2 = ((lam*su)**2*cos2 - (lam*sd2u)**2*sin2) / (cos2 - sin2)
+    b2 = ((lam*sd2u)**2*cos2 - (lam*su)**2*sin2) / (cos2 - sin2)
+    ur = u*np.cos(theta) + d2u*np.sin(theta)
+    d2ur = -u*np.sin(theta) + d2u*np.cos(theta)
+
+    outside = ((u/(lam*su))**2 + (du/(lam*sdu))**2 > 1) \
+            | ((du/(lam*sdu))**2 + (d2u/(lam*sd2u))**2 > 1) \
+            | (ur**2/a2 + d2ur**2/b2 > 1)
+
+    new = outside & ~spikes
+    if not new.any():
+      break
+    spikes |= outside
+
+    # Replace every spike of each component from its good neighbors
+    for j in np.flatnonzero(new.any(axis=0)):
+      good = ~spikes[:,j]
+      x[spikes[:,j],j] = np.interp(index[spikes[:,j]], index[good], x[good,j])
+
+  if squeeze:
+    return x[:,0], spikes[:,0]
+  return x, spikes
+
+def despikeFrame(vels, columns=VELOCITY_COLUMNS, maxIter=20, valid=None):
+  '''
+  Copy of a velocity dataframe with the `columns` despiked together by
+  phaseSpaceDespike. Returns (dataframe, boolean dataframe of spikes)
+  '''
+  clean, spikes = phaseSpaceDespike(vels[columns], maxIter, valid)
+  despiked = vels.copy()
+  despiked[columns] = clean.astype(vels[columns].dtypes.iloc[0], copy=False)
+  return despiked, pd.DataFrame(spikes, index=vels.index, columns=columns)
+
+## UNCERTAINTY
+
+def blockBootstrap(x, blockLength, nBoot=1000, confidence=0.95, seed=None, mask=None):
+  '''
+  Moving-block bootstrap confidence intervals of the means, the six
+  u'ᵢu'ⱼ and the tke of an N×3 velocity record. Resamples are built from
+  blocks of `blockLength` samples, which should be longer than the
+  correlation of the record (e.g., 2T/Δt, see integralTimeScale), so they
+  keep its autocorrelation. Only the samples where `mask` is True are used.
+
+  The start of every block of every resample is drawn as one index matrix
+  and each block is summed from running sums of the record, so memory
+  grows with nBoot·N/blockLength instead of nBoot·N. Returns a dict with
+  the blockLength used and (low, high) intervals: mean as a 3×2 array,
+  components keyed as in reynoldsFromMoments, and tke.
+  '''
+  x = np.asarray(x, dtype=np.float64)
+  if mask is not None:
+    x = x[np.asarray(mask, dtype=bool)]
+
+  n = len(x)
+  L = int(min(max(blockLength, 1), n))
+  k = -(-n // L)
+  rows, cols = np.triu_indices(3)
+
+  # Running sums of the fluctuations and their products, so any block is a difference
+  center = x.mean(axis=0)
+  fluct = x - center
+  values = np.column_stack([fluct, fluct[:,rows] * fluct[:,cols]])
+  running = np.zeros((n + 1, values.shape[1]))
+  np.cumsum(values, axis=0, out=running[1:])
+  blockSums = running[L:] - running[:-L]
+
+  starts = np.random.default_rng(seed).integers(0, n - L + 1, size=(nBoot, k))
+  moments = np.column_stack([blockSums[:,c][starts].sum(axis=1) for c in range(values.shape[1])]) / (k*L)
+
+  means = moments[:,:3]
+  products = moments[:,3:] - means[:,rows] * means[:,cols]
+  tke = 0.5 * products[:, rows == cols].sum(axis=1)
+
+  q = [(1 - confidence)/2, (1 + confidence)/2]
+  names = 'uvw'
+
+  return {
+    'blockLength' : L,
+    'mean'        : (center + np.quantile(means, q, axis=0)).T,
+    'components'  : {names[i]+names[j]:np.quantile(products[:,c], q) \
+                     for c, (i, j) in enumerate(zip(rows, cols))},
+    'tke'         : np.quantile(tke, q)
+  }
@@ -0,0 +1,46 @@
+'''
+Benchmark of the phase-space despiking on long synthetic records.
+
+Velocities are red noise around a mean flow with spikes injected in the
+streamwise component. Run from the repository root:
+
+    python benchmarks/despike.py [number of samples ...]
+'''
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from adv_processing import phaseSpaceDespike
+
+def syntheticRecord(n, nSpikes, seed=0):
+    '''
+    N×3 velocity record (AR(1) fluctuations, filtered in the frequency
+    domain) and the indices of the spikes added to its first column
+    '''
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal((n,3))
+    omega = 2*np.pi*np.fft.rfftfreq(n)
+    response = 1/(1 - 0.95*np.exp(-1j*omega))
+    x = np.fft.irfft(np.fft.rfft(noise, axis=0)*response[:,None], n, axis=0)
+    x = 0.01*x + np.array([0.3, 0.0, 0.0])
+
+    idx = rng.choice(n, nSpikes, replace=False)
+    x[idx,0] += rng.choice([-1,1], nSpikes) * rng.uniform(0.2, 0.5, nSpikes)
+    return x, idx
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or [100_000, 1_000_000, 4_000_000]
+
+    print(f"{'samples':>10} {'seconds':>8} {'Msamples/s':>11} {'detected':>9} {'flagged':>8}")
+    for n in sizes:
+        x, idx = syntheticRecord(n, n//500)
+
+        start = time.perf_counter()
+        _, spikes = phaseSpaceDespike(x)
+        elapsed = time.perf_counter() - start
+
+        detected = np.isin(idx, np.flatnonzero(spikes[:,0])).mean()
+        print(f"{n:>10} {elapsed:>8.2f} {n/elapsed/1e6:>11.2f} {detected:>9.1%} {spikes.mean():>8.2%}")
@@ -0,0 +1,74 @@
+'''
+Cold-start benchmark of the app pages: time to the first render of each
+page in a fresh interpreter, as in a new container, and the heavy
+libraries that render loaded. Streamlit itself is imported before the
+clock starts, since every page pays for it; the heavy libraries that
+`import streamlit` already brings in (e.g., plotly.graph_objects) are
+reported apart, as deferring them in a page saves nothing. Run from the
+repository root:
+
+    python benchmarks/startup.py [repetitions]
+'''
+import glob
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+## Libraries whose import cost the pages try to defer
+HEAVY_MODULES = ["pandas", "netCDF4", "plotly.graph_objects", "plotly.subplots",
+                 "extra_streamlit_components", "pyarrow"]
+
+## Runs in the child interpreter: first render of one page with AppTest
+CHILD = '''
+import json, logging, sys, time
+sys.path.insert(0, {root!r})
+logging.disable(logging.WARNING)
+
+baseline = set(sys.modules)
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+streamlitSeconds = time.perf_counter() - start
+
+before = set(sys.modules)
+start = time.perf_counter()
+at = AppTest.from_file({page!r}, default_timeout=120).run()
+elapsed = time.perf_counter() - start
+
+print(json.dumps({{
+    "seconds"          : elapsed,
+    "errors"           : len(at.exception),
+    "streamlitSeconds" : streamlitSeconds,
+    "byStreamlit"      : [m for m in {heavy!r} if m in before and m not in baseline],
+    "loaded"           : [m for m in {heavy!r} if m in sys.modules and m not in before]
+}}))
+'''
+
+def firstRender(page):
+    '''Seconds to the first render of a page in a new interpreter and what it loaded'''
+    code = CHILD.format(root=ROOT, page=page, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    pages = sorted(glob.glob(os.path.join(ROOT, "*.py"))) + sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+
+    allRuns = {page:[firstRender(page) for _ in range(repetitions)] for page in pages}
+
+    first = next(iter(allRuns.values()))
+    print(f"import streamlit: {np.median([r['streamlitSeconds'] for r in first]):.3f} s, "
+          f"already loads {', '.join(first[-1]['byStreamlit']) or '-'}\n")
+
+    print(f"{'page':<36} {'median s':>9} {'max s':>7}  heavy imports")
+    for page, runs in allRuns.items():
+        seconds = [r["seconds"] for r in runs]
+        name = os.path.relpath(page, ROOT)
+        errors = " (errors)" if any(r["errors"] for r in runs) else ""
+        print(f"{name:<36} {np.median(seconds):>9.3f} {max(seconds):>7.3f}  "
+              f"{', '.join(runs[-1]['loaded']) or '-'}{errors}")
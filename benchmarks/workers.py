@@ -0,0 +1,65 @@
+'''
+Check that the background workers stay free of the UI: each page that
+submits jobs is run with AppTest in a fresh interpreter, the sample file
+is uploaded so the workers start from within the script run, and the
+workers are asked whether they imported Streamlit or Plotly. Exits with
+status 1 if any did. Run from the repository root:
+
+    python benchmarks/workers.py
+'''
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+## Pages that submit jobs to the shared pool, and the key of their uploader
+PAGES = {
+    "pages/01_🖥️_Processing_a_file.py" : "upfile",
+    "pages/03_📈_Profiles.py"          : "profileFiles"
+}
+
+## Runs in the child interpreter: starts the workers from one page
+CHILD = '''
+import json, logging, sys
+sys.path.insert(0, {root!r})
+logging.disable(logging.WARNING)
+from streamlit.testing.v1 import AppTest
+from adv_processing import sharedPool
+
+with open({sample!r}, "rb") as f:
+    raw = f.read()
+
+at = AppTest.from_file({page!r}, default_timeout=120).run()
+at.file_uploader(key={uploader!r}).upload("dummyADV.nc", raw).run()
+
+print(json.dumps({{
+    "started" : len(sharedPool()) > 0,
+    "loaded"  : sharedPool().workerModules()
+}}))
+'''
+
+def workerModules(page, uploader):
+    '''UI modules imported by the workers started from a page'''
+    code = CHILD.format(root=ROOT, page=os.path.join(ROOT, page), uploader=uploader,
+                        sample=os.path.join(ROOT, "assets", "dummyADV.nc"))
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    failed = False
+    for page, uploader in PAGES.items():
+        result = workerModules(page, uploader)
+        if not result["started"]:
+            status = "no job was submitted"
+            failed = True
+        elif result["loaded"]:
+            status = "workers imported " + ", ".join(result["loaded"])
+            failed = True
+        else:
+            status = "ok"
+        print(f"{page:<36} {status}")
+
+    sys.exit(1 if failed else 0)
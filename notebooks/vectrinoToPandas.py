@@ -1,30 +1,11 @@
-import numpy as np
-import pandas as pd
-import netCDF4
+'''
+Kept for the notebooks and scripts written against this module. The
+processing now lives in the adv_processing package at the root of the
+repository, which is re-exported here.
+'''
+import os
+import sys
 
-## DATA PROCESSING
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
 
-def readFile(filePath):
-  '''
-  Reads a netCDF Vectrino file and returns its contents as two pandas
-  dataframes
-  '''
-  f = netCDF4.Dataset(filePath)
-  
-  # Organize profiles in a single pandas dataframe
-  data = f['Data']['Profiles']
-  shapeTime = data['time'].shape
-  prof = pd.DataFrame({k:np.array(data[k]) \
-                     for k in list(data.variables.keys()) \
-                     if data[k].shape == shapeTime})
-  
-  # Organize bottom check in a separate pandas dataframe
-  data = f['Data']['BottomCheck']
-  shapeTime = data['time'].shape
-  bott = pd.DataFrame({k:np.array(data[k]) \
-                     for k in list(data.variables.keys()) \
-                     if data[k].shape == shapeTime})
-  
-  f.close()
-  
-  return prof,bott
+from adv_processing import *
@@ -1,11 +1,7 @@
-import pandas as pd
 import streamlit as st
-import extra_streamlit_components as stx
-import tempfile
+import hashlib
+import io
 import numpy as np
-import netCDF4
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 
 st.set_page_config(
     page_title="[NU CEE440] Lab 1 - Processing a single file",
@@ -14,13 +10,168 @@ st.set_page_config(
     initial_sidebar_state="auto"
 )
 
+def inBackground(label, key, fn, *args):
+    '''
+    Result of fn(*args), run in the worker pool shared by every session of
+    the server. While the job is queued or running its status is shown and
+    the rest of the page waits for it, the widgets above stay usable.
+    Finished jobs are kept by key (e.g., the content hash of the file), so
+    reruns from the widgets get the result right away. A job that failed
+    is reported and only submitted again when asked to.
+    '''
+    pool = sharedPool()
+    failed = st.session_state.setdefault("_failedJobs", {})
+
+    error = pool.failure(key)
+    if error is not None:
+        failed[key] = error
+        pool.forget(key)
+
+    if key not in failed:
+        future = pool.submit(key, fn, *args)
+        if not future.done():
+            jobStatus(label, key)
+            st.stop()
+        try:
+            return future.result()
+        except Exception as e:
+            failed[key] = f"{type(e).__name__}: {e}"
+            pool.forget(key)
+
+    st.error(f"{label} failed · {failed[key]}", icon="🚫")
+    st.button("↻ Try again", on_click=failed.pop, args=(key, None))
+    st.stop()
+
+@st.fragment(run_every=0.5)
+def jobStatus(label, key):
+    '''Status of a background job, refreshed until it finishes'''
+    pool = sharedPool()
+    status = pool.status(key)
+    if status not in ("queued", "running"):
+        st.rerun()
+
+    st.info(f"{label} · {status} · {pool.pending()} jobs in the queue of this server, "
+            f"{pool.maxWorkers} processed at a time", icon="⏳")
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def qualityUpload(fileHash, minCorrelation, minSNR, _vels):
+    '''
+    Mask of the pings of an uploaded file that pass the correlation and
+    SNR thresholds and the rejection report, cached by content hash.
+    '''
+    return qualityMask(_vels, minCorrelation, minSNR)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def turbulenceStats(fileHash, despike, quality, _vels, _valid):
+    '''
+    Means, Reynolds stresses and turbulent kinetic energy of an uploaded
+    file, cached by its content hash, whether it was despiked and the
+    quality thresholds.
+    '''
+    return reynoldsStats(_vels, mask=_valid)
+
+@st.cache_data(max_entries=16, show_spinner="Computing spectra...")
+def spectraUpload(fileHash, despike, quality, nperseg, _vels, columns):
+    '''
+    Sampling rate, frequencies and Welch spectra of the velocity
+    components of an uploaded file, cached by content hash, processing
+    parameters and segment length.
+    '''
+    fs = samplingRate(_vels['time'])
+    frequencies, psd = welchPSD(_vels[columns].to_numpy().T, fs, nperseg)
+    return fs, frequencies, psd
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def timeScalesUpload(fileHash, despike, quality, _vels, columns):
+    '''
+    Sampling interval and integral time scales of the velocity components
+    of an uploaded file, cached by content hash and processing parameters.
+    '''
+    dt = 1/samplingRate(_vels['time'])
+    return dt, integralTimeScale(autocorrelation(_vels[columns].to_numpy().T), dt)
+
+@st.cache_data(max_entries=16, show_spinner="Bootstrapping...")
+def bootstrapUpload(fileHash, despike, quality, blockLength, _vels, _valid):
+    '''
+    Block-bootstrap confidence intervals of the means, Reynolds stresses
+    and tke of an uploaded file, cached by content hash, processing
+    parameters and block length.
+    '''
+    return blockBootstrap(_vels[VELOCITY_COLUMNS], blockLength, mask=_valid, seed=0)
+
+## Samples sent to the browser per trace of the velocity plots
+MAX_POINTS = 4000
+
+## Formats offered by the download buttons: (file suffix, mime type)
+EXPORT_FORMATS = {
+    "CSV"        : (".csv", "text/csv"),
+    "CSV (gzip)" : (".csv.gz", "application/gzip"),
+    "Parquet"    : (".parquet", "application/vnd.apache.parquet")
+}
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def exportPayload(fileHash, tableName, params, fmt, _table):
+    '''
+    Serializes a table of an uploaded file in one of the EXPORT_FORMATS.
+    Cached by file, table, processing parameters and format.
+    '''
+    if fmt == "Parquet":
+        buffer = io.BytesIO()
+        _table.to_parquet(buffer, compression="zstd")
+        return buffer.getvalue()
+
+    buffer = io.BytesIO()
+    _table.to_csv(buffer, compression="gzip" if fmt == "CSV (gzip)" else None)
+    return buffer.getvalue()
+
+## Rows per page of the dataset previews
+PREVIEW_ROWS = 100
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def summaryStats(fileHash, tableName, params, _table):
+    '''
+    Summary statistics of every column of a table of an uploaded file.
+    Cached by file, table and processing parameters.
+    '''
+    return _table.describe().T
+
+def previewTable(table, tableName, fileHash, params=(), height=200, subset=None):
+    '''
+    Shows one page of rows of a table, so only PREVIEW_ROWS rows are
+    formatted and sent to the browser, next to the summary statistics of
+    the entire table.
+    '''
+    rowsTab, statsTab = st.tabs(["📄 Rows", "🧮 Summary"])
+
+    with rowsTab:
+        nPages = max(1, -(-len(table) // PREVIEW_ROWS))
+        page = st.number_input(f"Page (of {nPages})", 1, nPages, 1,
+                               key=f"{tableName}_page", disabled=(nPages == 1))
+        rows = table.iloc[(page-1)*PREVIEW_ROWS : page*PREVIEW_ROWS]
+        st.dataframe(rows.style.format(precision=4, subset=subset), height=height)
+        st.caption(f"Rows {rows.index[0]} to {rows.index[-1]} of {len(table)}")
+
+    with statsTab:
+        st.dataframe(summaryStats(fileHash, tableName, params, table).style.format(precision=4),
+                     height=height)
+
+def downloadButton(label, table, tableName, fileHash, params=(), disabled=False):
+    '''
+    Download button whose payload is only generated when clicked, in the
+    format picked in the sidebar.
+    '''
+    fmt = st.session_state.get("exportFormat", "CSV")
+    suffix, mime = EXPORT_FORMATS[fmt]
+    st.download_button(f"{label} as {fmt}",
+        data = lambda: exportPayload(fileHash, tableName, params, fmt, table),
+        file_name = tableName + suffix,
+        mime = mime,
+        disabled = disabled)
+
 def restart():
     if "upfile" in st.session_state.keys():
         del st.session_state.upfile
 
-if "_gist" not in st.session_state.keys():
-    st.session_state["_gist"] = [0,0,0,0]
-
 if "_flumeDepth" not in st.session_state.keys():
     st.session_state["_flumeDepth"] = 0.15
 
@@ -73,348 +224,513 @@ with col2:
 
 if uploadedFile and ("upfile" in st.session_state.keys()):
 
-    step_int = stx.stepper_bar(steps=["🏜️ Bottom Distance", "⏱️ Velocity Readings", "☀️ Summary"])
+    # The processing and plotting libraries are only loaded once there is a file
+    import extra_streamlit_components as stx
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
 
-    with tempfile.NamedTemporaryFile() as ncFile:
-        
-        # Read file and parse as pandas dataframe
-        f = netCDF4.Dataset(ncFile,memory=uploadedFile.getvalue())
-        data = f['Data']['Profiles']
-        shapeTime = data['time'].shape
-            
-        vels = pd.DataFrame({k:np.array(data[k]) \
-                            for k in list(data.variables.keys()) \
-                            if data[k].shape == shapeTime})
-    
-        # Organize bottom check in a separate pandas dataframe
-        data = f['Data']['BottomCheck']
-        shapeTime = data['time'].shape
-        bott = pd.DataFrame({k:np.array(data[k]) \
-                            for k in list(data.variables.keys()) \
-                            if data[k].shape == shapeTime})
-
-        #####################################
-        # Step 1 - Bottom distance
-        #####################################
-        if step_int == 0:
-        
-            """
-            ## 🏜️ Bottom distance over time
-            """
+    from adv_processing import readBuffer, minMaxDownsample, reynoldsStats, VelocityMoments, \
+        despikeFrame, qualityMask, samplingRate, welchPSD, inertialSlope, logBin, \
+        autocorrelation, integralTimeScale, effectiveSamples, blockBootstrap, VELOCITY_COLUMNS, \
+        ResultsStore, assembleSummary, sharedPool
 
-            col1,col2 = st.columns([1,1.5],gap='medium')
-            
-            with col1:
-                st.image("assets/ADV_Distances.png",
-                    caption="Distances in the ADV setup")
-                
-            with col2:
-                with st.expander("😵‍💫  The entire dataset from the ADV",expanded=True):
-                    st.dataframe(bott.style.format(precision=4,subset=["time","BottomDistance"]),
-                                height=300)
+    # Results of every file processed in this session, also used in the profiles page
+    if "_results" not in st.session_state.keys():
+        st.session_state["_results"] = ResultsStore()
+    results = st.session_state["_results"]
 
-                    st.download_button("😵‍💫  Click here to download the entire dataset as CSV",
-                        data = bott.to_csv().encode('utf-8'),
-                        file_name = "Bottom.csv")
-                
-                """
-                Notice that we only need two columns from this dataset: 
-                - `time`
-                - `BottomDistance`
-                """
-                
-                filtered_bottom = bott[['time','BottomDistance']].copy()
-                
-                """
-                `BottomDistance` measures the lenght between the instrument and the 
-                channel bottom. However, we need the distance between the sample
-                and the bottom (`SamplePositionZ` in the sketch below) to properly 
-                locate the corresponding velocity readings.
-                """
+    st.sidebar.selectbox("⬇️ Format of the downloads", list(EXPORT_FORMATS), key="exportFormat")
 
+    step_int = stx.stepper_bar(steps=["🏜️ Bottom Distance", "⏱️ Velocity Readings", "☀️ Summary"])
 
-            "****"
-            
-            "#### Extract useful information:"
-            col1,col2 = st.columns([1,1.5],gap='medium')
+    # Pings with low correlation or SNR are left out of the statistics
+    with st.sidebar.expander("🚦 Quality control", expanded=False):
+        useQuality = st.checkbox("Reject low quality pings", True, key="useQuality")
+        minCorrelation = st.number_input("Minimum correlation [%]:",0.0,100.0,70.0,1.0,"%.0f",
+                                         disabled=not useQuality)
+        minSNR = st.number_input("Minimum SNR [dB]:",0.0,60.0,15.0,1.0,"%.0f",
+                                 disabled=not useQuality)
+
+    despike = st.sidebar.checkbox("🧹 Remove spikes (Goring & Nikora)", True, key="despike")
+
+    # Read file and parse as pandas dataframe in the background (kept by content)
+    rawBytes = uploadedFile.getvalue()
+    fileHash = hashlib.sha256(rawBytes).hexdigest()
+    vels, bott = inBackground(f"Reading `{uploadedFile.name}`", ("parse", fileHash), readBuffer, rawBytes)
+
+    if useQuality:
+        quality = (minCorrelation, minSNR)
+        valid, qualityReport = qualityUpload(fileHash, minCorrelation, minSNR, vels)
+    else:
+        quality, valid, qualityReport = None, None, None
+
+    # Spikes are removed before any statistic is computed
+    if despike:
+        # Only the velocities go to the worker and back
+        clean, spikes = inBackground(f"Removing spikes from `{uploadedFile.name}`",
+                                     ("despike", fileHash, quality),
+                                     despikeFrame, vels[VELOCITY_COLUMNS], VELOCITY_COLUMNS, 20, valid)
+        clean_vels = clean.assign(time=vels['time'])
+
+        # Pings rejected by the quality control are reported apart, not as spikes
+        nSpikes = (spikes if valid is None else spikes[valid]).sum()
+    else:
+        clean_vels, nSpikes = vels, None
+
+    # Blocks of the bootstrap span the decorrelation time 2T of the slowest component
+    dt, timeScales = timeScalesUpload(fileHash, despike, quality, clean_vels, VELOCITY_COLUMNS)
+    bootstrap = bootstrapUpload(fileHash, despike, quality, int(np.ceil(2*timeScales.max()/dt)),
+                                clean_vels, valid)
+
+    # Turbulence statistics for the Reynolds decomposition page
+    st.session_state["_turbulence"] = dict(turbulenceStats(fileHash, despike, quality, clean_vels, valid),
+                                           bootstrap=bootstrap, file=uploadedFile.name)
+
+    # Stored again only when the file or its processing change, so the elevation
+    # set in step 1 is not overwritten on every rerun
+    probeDist = st.session_state.get("_probeDist", 0.05)
+    summaryInputs = (fileHash, despike, quality, probeDist)
+    if st.session_state.get("_summaryInputs") != summaryInputs or fileHash not in results:
+        results.add(fileHash, uploadedFile.name,
+                    assembleSummary(bott['BottomDistance'], probeDist, st.session_state["_turbulence"],
+                                    qualityReport['rejected'] if qualityReport is not None else 0.0,
+                                    bootstrap))
+        st.session_state["_summaryInputs"] = summaryInputs
+
+    #####################################
+    # Step 1 - Bottom distance
+    #####################################
+    if step_int == 0:
+    
+        """
+        ## 🏜️ Bottom distance over time
+        """
 
-            with col1:
-                st.info("Adjust according to your lab setup", icon="🎚️")
-                
-                flumeDepth = st.number_input("Enter Flume depth [m]:",0.00,0.50,0.15,0.01,"%.2f")
-                probeDist  = st.number_input("Enter SampleDistance [m]:",0.00,0.10,0.05,0.001,"%.3f")
-                filtered_bottom['SamplePositionZ'] = filtered_bottom['BottomDistance'] - probeDist
-
-                st.session_state["_flumeDepth"] = flumeDepth
-
-                "****"
-
-                with st.expander("🍋 Our processed data",expanded=False):
-
-                    st.dataframe(filtered_bottom.style.format(precision=4),height=150)
-                    st.download_button("🍋 Click here to download this processed data as CSV",
-                        data = filtered_bottom.to_csv().encode('utf-8'),
-                        file_name = "Bottom_Processed.csv",
-                        disabled=True)
-                    
-                    meanZ = filtered_bottom['SamplePositionZ'].mean()
-                    stdZ  = filtered_bottom['SamplePositionZ'].std()
-
-                    st.metric("Mean  ±  stdev. of SamplePositionZ: ",
-                        f"{meanZ:.3f} ± {stdZ:.3f} m")
-                    
-                    ## Save in session state
-                    st.session_state["_gist"][0] = meanZ
+        col1,col2 = st.columns([1,1.5],gap='medium')
+        
+        with col1:
+            st.image("assets/ADV_Distances.png",
+                caption="Distances in the ADV setup")
             
-            with col2:
-
-                fig = go.Figure()
-                
-                fig.update_layout(
-                    showlegend=False,
-                    autosize=True,
-                    hovermode='closest',
-                    height=400,
-                    title={
-                        'text': "📈 Sample position over time",
-                        'y': 0.9,
-                        'x': 0.5,
-                        'xanchor': 'center',
-                        'yanchor': 'top'},
-                    xaxis={
-                        'title':"Time (s)",
-                        'exponentformat' : "power"},
-                    yaxis={
-                        'title':"Bottom Distance (m)",
-                        'exponentformat' : "power",
-                        'range':[0,1.1*flumeDepth]},
-                    font={
-                        'size': 14}
-                    )
-
-                fig.add_trace(
-                            go.Scatter(
-                                x = filtered_bottom['time'],
-                                y = filtered_bottom['SamplePositionZ'],
-                                name = "Sampling position",
-                                mode = 'lines+markers',
-                                marker={'size' : 8,
-                                        'symbol': "x" }
-                                ))
-
-                fig.add_hline(y=flumeDepth,
-                                annotation={
-                                    'text':"Water surface",
-                                    'font_size':12,
-                                    'font_color': "#1E90FF"     
-                                },
-                                annotation_position="top left",
-                                line = {
-                                    'width':2,
-                                    'color':"#1E90FF",
-                                    'dash':'dash'
-                                }
-                            )
-                
-                st.plotly_chart(fig,use_container_width=True)
+        with col2:
+            with st.expander("😵‍💫  The entire dataset from the ADV",expanded=True):
+                previewTable(bott, "Bottom", fileHash,
+                            height=300, subset=["time","BottomDistance"])
 
-        #####################################
-        # Step 2 - Velocity Readings
-        #####################################
-        elif step_int == 1:
+                downloadButton("😵‍💫  Click here to download the entire dataset",
+                    bott, "Bottom", fileHash)
+            
             """
-            ## ⏱️ Velocity Readings
+            Notice that we only need two columns from this dataset: 
+            - `time`
+            - `BottomDistance`
             """
-            col1,col2 = st.columns(2)
             
-            with col1:
-                r"""
-                Each component of the velocity timeseries $u_i(x,t)$ can be decomposed 
-                into its mean $\overline{u_i}$ and a series of fluctuations $u'(x,t)$. 
-                
-                $$
-                u_i(x,t) = \overline{u_i}(x) + u'_i(x,t)
-                $$
-                """
+            filtered_bottom = bott[['time','BottomDistance']].copy()
             
-            with col2:
-                r"""
-                For our ADV data:
-
-                | Component    | Decomposition      | 
-                |--------------|--------------------|
-                | `VelocityX`  | $u(t) = \overline{u} + u'(t)$ |
-                | `VelocityY`  | $v(t) = \overline{v} + v'(t)$ |
-                | `VelocityZ1` | $w(t) = \overline{w} + w'(t)$ |
-                """
-
-            r"""
-            ****
-            Notice that from our dataset we only need a few columns: 
-            - `time`
-            - `VelocityX`
-            - `VelocityY`
-            - `VelocityZ1` or `VelocityZ2`
+            """
+            `BottomDistance` measures the lenght between the instrument and the 
+            channel bottom. However, we need the distance between the sample
+            and the bottom (`SamplePositionZ` in the sketch below) to properly 
+            locate the corresponding velocity readings.
             """
 
-            directions = ['VelocityX','VelocityY','VelocityZ1']
-            filtered_vels = vels[['time'] + directions].copy()
 
-            with st.expander("😵‍💫  The entire velocity readings from the ADV",expanded=True):
-                st.dataframe(vels.style.format(precision=4),
-                            height=200)
+        "****"
+        
+        "#### Extract useful information:"
+        col1,col2 = st.columns([1,1.5],gap='medium')
 
-                st.download_button("😵‍💫  Click here to download the entire dataset as CSV",
-                    data = vels.to_csv().encode('utf-8'),
-                    file_name = "Velocity.csv")
+        with col1:
+            st.info("Adjust according to your lab setup", icon="🎚️")
+            
+            flumeDepth = st.number_input("Enter Flume depth [m]:",0.00,0.50,0.15,0.01,"%.2f")
+            probeDist  = st.number_input("Enter SampleDistance [m]:",0.00,0.10,0.05,0.001,"%.3f")
+            filtered_bottom['SamplePositionZ'] = filtered_bottom['BottomDistance'] - probeDist
 
+            st.session_state["_flumeDepth"] = flumeDepth
+            st.session_state["_probeDist"] = probeDist
 
-            fig = make_subplots(rows=1, cols=3,
-                                shared_yaxes=True,
-                                horizontal_spacing=0.02,
-                                subplot_titles = [rf'<em>{i}(t)</em>' for i in ['u','v','w']],
-                                x_title="Time (s)")
-            
-            for i,direction in enumerate(directions,start=1):
-                fig.add_trace(
-                    go.Scatter(
-                        x = filtered_vels['time'],
-                        y = filtered_vels[direction],
-                    name = direction,
-                    mode = 'lines',
-                    line = {
-                        "width":0.5}
-                    ),
-                row = 1, col = i)
+            "****"
+
+            with st.expander("🍋 Our processed data",expanded=False):
 
-                meanVel = filtered_vels[direction].mean()
+                previewTable(filtered_bottom, "Bottom_Processed", fileHash, (probeDist,), height=150)
+                downloadButton("🍋 Click here to download this processed data",
+                    filtered_bottom, "Bottom_Processed", fileHash, (probeDist,),
+                    disabled=True)
                 
-                fig.add_hline(y = meanVel,
-                    annotation={
-                        'text':"Mean",
-                        'font_size':12,
-                        'bgcolor':"rgba(0,0,0,0.2)"
-                        },
-                    annotation_position="top left",
-                    line = {
-                        'width':2,
-                        'dash':'dash'
-                        },
-                    row = 1, col = i)
+                meanZ = filtered_bottom['SamplePositionZ'].mean()
+                stdZ  = filtered_bottom['SamplePositionZ'].std()
+
+                st.metric("Mean  ±  stdev. of SamplePositionZ: ",
+                    f"{meanZ:.3f} ± {stdZ:.3f} m")
                 
                 ## Save in session state
-                st.session_state["_gist"][i] = meanVel
-
-            st.plotly_chart(fig,use_container_width=True,include_mathjax='cdn')
+                results.update(fileHash, z=meanZ, zStd=stdZ)
+        
+        with col2:
 
-            # "*****"
-            col1,col2 = st.columns([1,1],gap='medium')
+            fig = go.Figure()
+            
+            fig.update_layout(
+                showlegend=False,
+                autosize=True,
+                hovermode='closest',
+                height=400,
+                title={
+                    'text': "📈 Sample position over time",
+                    'y': 0.9,
+                    'x': 0.5,
+                    'xanchor': 'center',
+                    'yanchor': 'top'},
+                xaxis={
+                    'title':"Time (s)",
+                    'exponentformat' : "power"},
+                yaxis={
+                    'title':"Bottom Distance (m)",
+                    'exponentformat' : "power",
+                    'range':[0,1.1*flumeDepth]},
+                font={
+                    'size': 14}
+                )
 
-            with col1:
-                with st.expander("🍋 Our filtered data",expanded=True):
-                    st.dataframe(filtered_vels.style.format(precision=4),height=150)
-                    st.download_button("🍋 Click here to download this processed data as CSV",
-                        data = filtered_vels.to_csv().encode('utf-8'),
-                        file_name = "Bottom_Processed.csv",
-                        disabled=True)
+            fig.add_trace(
+                        go.Scatter(
+                            x = filtered_bottom['time'],
+                            y = filtered_bottom['SamplePositionZ'],
+                            name = "Sampling position",
+                            mode = 'lines+markers',
+                            marker={'size' : 8,
+                                    'symbol': "x" }
+                            ))
+
+            fig.add_hline(y=flumeDepth,
+                            annotation={
+                                'text':"Water surface",
+                                'font_size':12,
+                                'font_color': "#1E90FF"     
+                            },
+                            annotation_position="top left",
+                            line = {
+                                'width':2,
+                                'color':"#1E90FF",
+                                'dash':'dash'
+                            }
+                        )
             
-            with col2:
-                for direction in directions:
-                    mean = filtered_vels[direction].mean()
-                    stdv = filtered_vels[direction].std()
-                    st.metric(f"Mean  ±  stdev. of  {direction}",
-                                f"{mean:.3f} ± {stdv:.3f} m/s")
+            st.plotly_chart(fig,use_container_width=True)
+
+    #####################################
+    # Step 2 - Velocity Readings
+    #####################################
+    elif step_int == 1:
+        """
+        ## ⏱️ Velocity Readings
+        """
+        col1,col2 = st.columns(2)
         
-        #####################################
-        # Step 3 - Summary
-        #####################################
-        elif step_int == 2:
+        with col1:
+            r"""
+            Each component of the velocity timeseries $u_i(x,t)$ can be decomposed 
+            into its mean $\overline{u_i}$ and a series of fluctuations $u'(x,t)$. 
+            
+            $$
+            u_i(x,t) = \overline{u_i}(x) + u'_i(x,t)
+            $$
             """
-            ## ☀️ Summary
+        
+        with col2:
+            r"""
+            For our ADV data:
 
-            From this file, you have obtained a the velocities measured at
-            a **single position** $x$.
+            | Component    | Decomposition      | 
+            |--------------|--------------------|
+            | `VelocityX`  | $u(t) = \overline{u} + u'(t)$ |
+            | `VelocityY`  | $v(t) = \overline{v} + v'(t)$ |
+            | `VelocityZ1` | $w(t) = \overline{w} + w'(t)$ |
             """
 
-            cols = st.columns(4)
+        r"""
+        ****
+        Notice that from our dataset we only need a few columns: 
+        - `time`
+        - `VelocityX`
+        - `VelocityY`
+        - `VelocityZ1` or `VelocityZ2`
+        """
+
+        directions = ['VelocityX','VelocityY','VelocityZ1']
+        filtered_vels = clean_vels[['time'] + directions].copy()
+
+        if qualityReport is not None:
+            st.caption(f"🚦 {qualityReport['rejected']:.1%} of the pings are below the quality thresholds "
+                       f"(correlation: {qualityReport['correlation']:.1%}, SNR: {qualityReport['snr']:.1%}; " +
+                       ", ".join(f"{b}: {r:.1%}" for b,r in qualityReport['beams'].items()) +
+                       ") and are left out of the statistics.")
+
+        if nSpikes is not None:
+            st.caption("🧹 Spikes replaced by interpolation: " +
+                       ", ".join(f"{n} in `{d}`" for d,n in nSpikes.items()))
+
+        # Statistics of the valid samples only
+        moments = VelocityMoments().update(filtered_vels[directions], valid)
+
+        with st.expander("😵‍💫  The entire velocity readings from the ADV",expanded=True):
+            previewTable(vels, "Velocity", fileHash,
+                        height=200)
+
+            downloadButton("😵‍💫  Click here to download the entire dataset",
+                vels, "Velocity", fileHash)
+
+
+        # Time window to plot, shown at full resolution once it fits MAX_POINTS
+        tmin, tmax = float(filtered_vels['time'].iloc[0]), float(filtered_vels['time'].iloc[-1])
+        window = st.slider("🔍 Time window to plot (s)", tmin, tmax, (tmin, tmax), key="timeWindow")
+        timeArray = filtered_vels['time'].to_numpy()
+        first = np.searchsorted(timeArray, window[0], side='left')
+        last  = np.searchsorted(timeArray, window[1], side='right')
+        windowed_vels = filtered_vels.iloc[first:last]
+
+        fig = make_subplots(rows=1, cols=3,
+                            shared_yaxes=True,
+                            horizontal_spacing=0.02,
+                            subplot_titles = [rf'<em>{i}(t)</em>' for i in ['u','v','w']],
+                            x_title="Time (s)")
+        
+        for i,direction in enumerate(directions,start=1):
+            xPlot, yPlot = minMaxDownsample(windowed_vels['time'],windowed_vels[direction],MAX_POINTS)
+            fig.add_trace(
+                go.Scattergl(
+                    x = xPlot,
+                    y = yPlot,
+                name = direction,
+                mode = 'lines',
+                line = {
+                    "width":0.5}
+                ),
+            row = 1, col = i)
+
+            meanVel = moments.mean[i-1]
+            
+            fig.add_hline(y = meanVel,
+                annotation={
+                    'text':"Mean",
+                    'font_size':12,
+                    'bgcolor':"rgba(0,0,0,0.2)"
+                    },
+                annotation_position="top left",
+                line = {
+                    'width':2,
+                    'dash':'dash'
+                    },
+                row = 1, col = i)
 
-            z,u,v,w = st.session_state['_gist']
-            d = st.session_state["_flumeDepth"]
+        st.plotly_chart(fig,use_container_width=True,include_mathjax='cdn')
 
-            with cols[0]: 
-                    st.metric("Elevation:",f"{z:.3f} m")
+        if len(windowed_vels) > MAX_POINTS:
+            st.caption(f"Showing the extremes of {len(windowed_vels)} samples with {len(xPlot)} points per component. "
+                       "Narrow the time window to see the full resolution.")
 
-            for i,(col,direction) in enumerate(zip(cols[1:],["X","Y","Z"])):
-                with col: 
-                    st.metric(
-                        f"Velocity {direction}:",
-                        f"{st.session_state['_gist'][i+1]:.3f} ᵐ/ₛ")
+        # "*****"
+        col1,col2 = st.columns([1,1],gap='medium')
+
+        with col1:
+            with st.expander("🍋 Our filtered data",expanded=True):
+                previewTable(filtered_vels, "Velocity_Processed", fileHash, (despike, quality), height=150)
+                downloadButton("🍋 Click here to download this processed data",
+                    filtered_vels, "Velocity_Processed", fileHash, (despike, quality),
+                    disabled=True)
+        
+        with col2:
+            # Fluctuations are correlated in time, so not every sample is independent
+            dt, timeScales = timeScalesUpload(fileHash, despike, quality, filtered_vels, directions)
+            nEffective = effectiveSamples(moments.n, dt, timeScales)
+
+            for direction, mean, stdv, T, nEff, (low, high) in zip(directions, moments.mean, moments.std(),
+                                                                  timeScales, nEffective, bootstrap['mean']):
+                st.metric(f"Mean  ±  stdev. of  {direction}",
+                            f"{mean:.3f} ± {stdv:.3f} m/s",
+                            f"95% CI [{low:.4f}, {high:.4f}] m/s", delta_color="off",
+                            help=f"Moving-block bootstrap with blocks of {bootstrap['blockLength']} samples")
+                st.caption(f"Integral time scale {T:.3f} s · {nEff:.0f} independent samples "
+                           f"of {moments.n} · standard error of the mean ± {stdv/np.sqrt(nEff):.4f} m/s")
+
+        with st.expander("🎼 Frequency content of the velocity fluctuations",expanded=False):
+            col1,col2 = st.columns([1,2.5],gap='medium')
 
-            col1, col2 = st.columns(2)
-            
             with col1:
                 r"""
-                ****
-                
-                After doing this analysis for all the measured elevations (i.e., all
-                the ADV files), you will have the information to start buildind the 
-                velocity profile! 
-
-                Check the next page about the other information that can be extracted
-                from the velocity measurements at a single point.
+                The power spectral density $S_{ii}(f)$ shows how the energy of the
+                fluctuations is distributed over frequencies. In the **inertial
+                subrange** it should decay as $S_{ii} \propto f^{-5/3}$.
                 """
+                segments = [n for n in (128,256,512,1024,2048) if n <= len(filtered_vels)] or [len(filtered_vels)]
+                nperseg = st.select_slider("Samples per Welch segment:", segments,
+                                           value=min(256, segments[-1]))
+                fs, frequencies, psd = spectraUpload(fileHash, despike, quality, nperseg,
+                                                     filtered_vels, directions)
+                band = st.slider("Fitting band [Hz]:", 0.0, fs/2, (1.0, fs/4), 0.1)
+                slopes, intercepts = inertialSlope(frequencies, psd, *band)
+
+                for direction, slope in zip(directions, slopes):
+                    st.metric(f"Slope of the spectrum of {direction}", f"{slope:.2f}",
+                              f"{slope + 5/3:+.2f} from -5/3", delta_color="off")
 
             with col2:
                 fig = go.Figure()
-                    
+                fBinned, psdBinned = logBin(frequencies, psd)
+
+                for direction, name, p in zip(directions, ['u','v','w'], psdBinned):
+                    fig.add_trace(
+                        go.Scatter(
+                            x = fBinned,
+                            y = p,
+                            name = f"<em>S<sub>{name}{name}</sub></em>",
+                            mode = 'lines'))
+
+                # -5/3 reference through the fitted streamwise spectrum
+                fRef = np.geomspace(*[max(b, frequencies[1]) for b in band], 20)
+                fig.add_trace(
+                    go.Scatter(
+                        x = fRef,
+                        y = 10**intercepts[0] * fRef**(-5/3),
+                        name = "f<sup>-5/3</sup>",
+                        mode = 'lines',
+                        line = {
+                            'width':2,
+                            'dash':'dash',
+                            'color':"#050505"}))
+
                 fig.update_layout(
-                    showlegend=False,
                     autosize=True,
                     hovermode='closest',
-                    height=400,
+                    height=450,
                     title={
-                        'text': "📈 My file in the velocity profile",
-                            'y': 0.9,
-                            'x': 0.5,
-                            'xanchor': 'center',
-                            'yanchor': 'top'},
-                        xaxis={
-                            'title':"Velocity (m/s)",
-                            'exponentformat' : "power"},
-                        yaxis={
-                            'title':"Elevation (m)",
-                            'exponentformat' : "power",
-                            'range':[0,1.1*d]},
-                        font={
-                            'size': 14}
-                )
+                        'text': "🎼 Power spectral density",
+                        'y': 0.9,
+                        'x': 0.5,
+                        'xanchor': 'center',
+                        'yanchor': 'top'},
+                    xaxis={
+                        'title':"Frequency (Hz)",
+                        'type':'log',
+                        'exponentformat' : "power"},
+                    yaxis={
+                        'title':"PSD (m²/s²/Hz)",
+                        'type':'log',
+                        'exponentformat' : "power"},
+                    font={
+                        'size': 14}
+                    )
+
+                st.plotly_chart(fig,use_container_width=True)
+    
+    #####################################
+    # Step 3 - Summary
+    #####################################
+    elif step_int == 2:
+        """
+        ## ☀️ Summary
+
+        From this file, you have obtained a the velocities measured at
+        a **single position** $x$.
+        """
+
+        cols = st.columns(4)
+
+        mine = results.get(fileHash)
+        z,u = mine['z'], mine['u']
+        d = st.session_state["_flumeDepth"]
+
+        with cols[0]: 
+                st.metric("Elevation:",f"{z:.3f} m")
+
+        for col,direction,name in zip(cols[1:],["X","Y","Z"],'uvw'):
+            with col: 
+                st.metric(
+                    f"Velocity {direction}:",
+                    f"{mine[name]:.3f} ᵐ/ₛ",
+                    f"95% CI [{mine[name+'Low']:.3f}, {mine[name+'High']:.3f}]", delta_color="off")
+
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            r"""
+            ****
+            
+            After doing this analysis for all the measured elevations (i.e., all
+            the ADV files), you will have the information to start buildind the 
+            velocity profile! 
+
+            Check the next page about the other information that can be extracted
+            from the velocity measurements at a single point.
+            """
 
+        with col2:
+            fig = go.Figure()
+                
+            fig.update_layout(
+                showlegend=False,
+                autosize=True,
+                hovermode='closest',
+                height=400,
+                title={
+                    'text': "📈 My file in the velocity profile",
+                        'y': 0.9,
+                        'x': 0.5,
+                        'xanchor': 'center',
+                        'yanchor': 'top'},
+                    xaxis={
+                        'title':"Velocity (m/s)",
+                        'exponentformat' : "power"},
+                    yaxis={
+                        'title':"Elevation (m)",
+                        'exponentformat' : "power",
+                        'range':[0,1.1*d]},
+                    font={
+                        'size': 14}
+            )
+
+            if len(results) > 1:
                 fig.add_trace(
                     go.Scatter(
-                        x = [u],
-                        y = [z],
-                        name = "Sampling position",
+                        x = results['u'],
+                        y = results['z'],
+                        text = results.names(),
+                        name = "Other files",
                         mode = 'markers',
-                        marker={'size' : 10,
-                                'symbol': "circle-dot" }
+                        marker={'size' : 8,
+                                'color' : "#B0B0B0"}
                         )
                     )
 
-                fig.add_hline(
-                    y=d,
-                    annotation={
-                        'text':"Water surface",
-                        'font_size':12,
-                        'font_color': "#1E90FF"     
-                    },
-                    annotation_position="top left",
-                    line = {
-                        'width':2,
-                        'color':"#1E90FF",
-                        'dash':'dash'
-                        }
+            fig.add_trace(
+                go.Scatter(
+                    x = [u],
+                    y = [z],
+                    name = "Sampling position",
+                    mode = 'markers',
+                    marker={'size' : 10,
+                            'symbol': "circle-dot" }
                     )
+                )
 
-                st.plotly_chart(fig,use_container_width=True)
+            fig.add_hline(
+                y=d,
+                annotation={
+                    'text':"Water surface",
+                    'font_size':12,
+                    'font_color': "#1E90FF"     
+                },
+                annotation_position="top left",
+                line = {
+                    'width':2,
+                    'color':"#1E90FF",
+                    'dash':'dash'
+                    }
+                )
+
+            st.plotly_chart(fig,use_container_width=True)
 
-            st.button("↻ I have another file",key="restart_btn",help="Click here to restart.",on_click=restart)
\ No newline at end of file
+        st.button("↻ I have another file",key="restart_btn",help="Click here to restart.",on_click=restart)
\ No newline at end of file
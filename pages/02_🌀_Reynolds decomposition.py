@@ -1,6 +1,4 @@
-import pandas as pd
 import streamlit as st
-import extra_streamlit_components as stx
 
 st.set_page_config(
     page_title="[NU CEE440] Lab 2 - Turbulence analysis",
@@ -9,6 +7,16 @@ st.set_page_config(
     initial_sidebar_state="auto"
 )
 
+## Statistics of the last file processed in page 01
+turbulence = st.session_state.get("_turbulence")
+
+def fromYourFile(label):
+    '''Expander with the results of the processed file, if any'''
+    if turbulence is None:
+        st.caption("🖥️ Process a file in the previous page to see the values from your data here.")
+        return None
+    return st.expander(f"🧮 {label} from `{turbulence['file']}`", expanded=False)
+
 
 r"""
 # 🌀 **Reynolds decomposition**
@@ -88,6 +96,27 @@ st.info(
     Calculate the six components of the Reynolds stress $\tau'_{ij}$
     """, icon="☑️")
 
+expander = fromYourFile("Reynolds stresses")
+if expander is not None:
+    import pandas as pd
+
+    with expander:
+        col1, col2 = st.columns(2)
+
+        with col1:
+            r"Mean products of the fluctuations $\overline{u_i'u_j'}$ [m²/s²]"
+            components = pd.DataFrame({'Value':turbulence['components']})
+            if turbulence.get('bootstrap') is not None:
+                components[['95% CI low','95% CI high']] = pd.DataFrame(
+                    turbulence['bootstrap']['components']).T
+            st.dataframe(components.style.format("{:.3e}"))
+
+        with col2:
+            r"Reynolds stress tensor $\tau'_{ij}$ [Pa]"
+            st.dataframe(
+                pd.DataFrame(turbulence['stress'],
+                    index=['x','y','z'], columns=['x','y','z']).style.format("{:.4f}"))
+
 r"""
 *****
 
@@ -117,6 +146,16 @@ st.info(
     Calculate the turbulent kinetic energy $k$
     """, icon="☑️")
 
+expander = fromYourFile("Turbulent kinetic energy")
+if expander is not None:
+    with expander:
+        if turbulence.get('bootstrap') is not None:
+            low, high = turbulence['bootstrap']['tke']
+            st.metric("Turbulent kinetic energy k", f"{turbulence['tke']:.3e} m²/s²",
+                      f"95% CI [{low:.3e}, {high:.3e}] m²/s²", delta_color="off")
+        else:
+            st.metric("Turbulent kinetic energy k", f"{turbulence['tke']:.3e} m²/s²")
+
 
 r"""
 
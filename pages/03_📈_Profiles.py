@@ -1,6 +1,7 @@
 import streamlit as st
 import plotly.graph_objects as go
 import numpy as np
+import hashlib
 
 st.set_page_config(
     page_title="[NU CEE440] Lab 1 - Profiles and fitting",
@@ -8,6 +9,34 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="auto")
 
+###########################################3
+# Data 
+###########################################3
+
+@st.fragment(run_every=1.0)
+def uploadProgress(jobs):
+    '''
+    Progress of the uploaded files being summarized in the worker pool of
+    the server, refreshed until all of them are finished
+    '''
+    pool = sharedPool()
+    statuses = {name:pool.status(key) for name, key in jobs.items()}
+    finished = sum(status not in ("queued", "running") for status in statuses.values())
+    if finished == len(jobs):
+        st.rerun()
+
+    st.progress(finished/len(jobs), f"⏳ {finished} of {len(jobs)} files processed")
+    st.caption(" · ".join(f"`{name}` {status}" for name, status in statuses.items()))
+
+def retryFailed():
+    '''Lets the uploaded files that failed be submitted again'''
+    failed = st.session_state.get("_failedJobs", {})
+    for key in [k for k in failed if k[0] == "summary"]:
+        del failed[key]
+
+if "_flumeDepth" not in st.session_state.keys():
+    st.session_state["_flumeDepth"] = 0.15
+
 ###########################################3
 # Plots 
 ###########################################3
@@ -80,26 +109,60 @@ def shearStressPlot():
         )
     return fig
 
-def velocityProfilePlot(controlContainer):
-    y = np.linspace(1.0E-10,0.11,11)
-    u = np.array([0,0.04,0.06,0.09,0.10,0.11,0.105,0.11,0.11])
+def velocityProfilePlot(controlContainer, profile=None, d=0.15):
+    if profile is None:
+        y = np.linspace(1.0E-10,0.11,11)
+        u = np.array([0,0.04,0.06,0.09,0.10,0.11,0.105,0.11,0.11])
+        uMax = 0.15
+    else:
+        y = profile['z'].to_numpy()
+        u = profile['u'].to_numpy()
+        uMax = max(0.15, 1.1*u.max())
     
-    yfit = np.geomspace(1.0E-10,0.15,111)
+    yfit = np.geomspace(1.0E-10,d,111)
     
     with controlContainer:
         st.markdown("<br>"*3,unsafe_allow_html=True)
         with st.expander("Fitting parameters:",expanded=True):
-            a = st.slider("A",0.0,0.15,0.10,0.001)
-            b = st.slider("B",0.0,0.10,0.03,0.001)
+            autoFit = st.toggle("Least-squares fit", value=(profile is not None))
+
+            fit = None
+            if autoFit:
+                from adv_processing import fitLogLaw
+
+                window = st.slider("Fit the points within  y/d:",0.0,1.0,(0.05,1.0),0.01)
+                try:
+                    fit = fitLogLaw(y[:len(u)],u[:len(y)],d,window)
+                except ValueError as e:
+                    st.error(e, icon="📉")
+
+            if fit is not None:
+                a, b = fit['A'], fit['B']
+                st.metric("A", f"{a:.4f}", f"95% CI [{fit['ciA'][0]:.4f}, {fit['ciA'][1]:.4f}]", delta_color="off")
+                st.metric("B", f"{b:.4f}", f"95% CI [{fit['ciB'][0]:.4f}, {fit['ciB'][1]:.4f}]", delta_color="off")
+                st.caption(f"R² = {fit['r2']:.3f} with {fit['n']} points")
+            else:
+                a = st.slider("A",0.0,uMax,min(0.10,uMax),0.001)
+                b = st.slider("B",0.0,0.10,0.03,0.001)
         
-    ufit = a + b*(1 + np.log(yfit/0.15))
+    ufit = a + b*(1 + np.log(yfit/d))
 
     fig = go.Figure()
 
+    # Bootstrap intervals of the means, when the profile comes from files
+    errorX = None
+    if profile is not None and 'uLow' in profile:
+        errorX = {
+            'type' : 'data',
+            'symmetric' : False,
+            'array' : profile['uHigh'] - profile['u'],
+            'arrayminus' : profile['u'] - profile['uLow']}
+
     fig.add_trace(
         go.Scatter(
             x = u,
             y = y,
+            error_x = errorX,
             mode = 'markers+lines',
             name = 'Velocity profile',
             line = {
@@ -125,23 +188,24 @@ def velocityProfilePlot(controlContainer):
         )
     )
 
-    fig.add_vline(
-        x=0.09,
-        annotation={
-            'text':"Bulk velocity  U",
-            'font_size':12,
-            'font_color': "#00008B"     
-            },
-            annotation_position="top left",
-            line = {
-                'width':2,
-                'color':"#00008B",
-                'dash':'dot'
-            }
-        )
+    if profile is None:
+        fig.add_vline(
+            x=0.09,
+            annotation={
+                'text':"Bulk velocity  U",
+                'font_size':12,
+                'font_color': "#00008B"     
+                },
+                annotation_position="top left",
+                line = {
+                    'width':2,
+                    'color':"#00008B",
+                    'dash':'dot'
+                }
+            )
 
     fig.add_hline(
-        y=0.15,
+        y=d,
         annotation={
             'text':"Water surface",
             'font_size':12,
@@ -169,11 +233,55 @@ def velocityProfilePlot(controlContainer):
         xaxis={
             'title':r'Time-averaged velocity  <i><span style="text-decoration:overline">u</span>(y)<i>',
             'exponentformat' : "power",
-            'range':[-0.01,0.16]},
+            'range':[-0.01,uMax+0.01]},
         yaxis={
             'title':r"Distance to bottom   <i>y</i>",
             'exponentformat' : "power",
-            'range':[-0.01,0.18]},
+            'range':[-0.01,1.2*d]},
+        font={
+            'size': 14}
+        )
+    return fig
+
+def componentsProfilePlot(profile, d=0.15):
+    fig = go.Figure()
+
+    for component, name in [('v','Transverse  v̄(y)'),('w','Vertical  w̄(y)')]:
+        fig.add_trace(
+            go.Scatter(
+                x = profile[component],
+                y = profile['z'],
+                mode = 'markers+lines',
+                name = name,
+                line = {
+                    'width' : 0.4
+                    },
+                marker = {
+                    'size' : 10
+                }
+            )
+        )
+
+    fig.add_vline(x=0, line = {'width':1, 'color':"#808080"})
+
+    fig.update_layout(
+        showlegend=True,
+        autosize=True,
+        hovermode='closest',
+        height=500,
+        title={
+            'text': "Transverse and vertical velocity profiles",
+            'y': 0.9,
+            'x': 0.5,
+            'xanchor': 'center',
+            'yanchor': 'top'},
+        xaxis={
+            'title':r"Time-averaged velocity",
+            'exponentformat' : "power"},
+        yaxis={
+            'title':r"Distance to bottom   <i>y</i>",
+            'exponentformat' : "power",
+            'range':[-0.01,1.2*d]},
         font={
             'size': 14}
         )
@@ -197,6 +305,73 @@ Having processed all the ADV files, you must have obtained a series of
 For the principal direction $x$, the profile should roughly look like the 
 one sketched in the plot below.
 """
+
+## Results of every file processed in this session, in this page or in page 01
+results = st.session_state.get("_results")
+
+with st.expander("📂 Build the profile from all your files", expanded=not results):
+    cols = st.columns([3,1])
+
+    with cols[0]:
+        profileFiles = st.file_uploader("Upload the netCDF4 files of every elevation","nc",True,key="profileFiles")
+
+    with cols[1]:
+        probeDist = st.number_input("Enter SampleDistance [m]:",0.00,0.10,
+                                    st.session_state.get("_probeDist",0.05),0.001,"%.3f")
+        flumeDepth = st.number_input("Enter Flume depth [m]:",0.00,0.50,
+                                     st.session_state["_flumeDepth"],0.01,"%.2f")
+        st.session_state["_flumeDepth"] = flumeDepth
+
+    if profileFiles:
+        from adv_processing import fileSummary, ResultsStore, sharedPool
+
+        if results is None:
+            results = st.session_state["_results"] = ResultsStore()
+
+        # Each file is summarized once per probe distance, in the background
+        summarized = st.session_state.setdefault("_summarized", {})
+        failed = st.session_state.setdefault("_failedJobs", {})
+        pool = sharedPool()
+        jobs = {}
+
+        hashes = [hashlib.sha256(f.getvalue()).hexdigest() for f in profileFiles]
+
+        # Room for every uploaded file, otherwise storing one would evict another
+        # that is then submitted again, and the page would never settle
+        results.reserve(len(set(results) | set(hashes)))
+
+        for f, fileHash in zip(profileFiles, hashes):
+            if summarized.get(fileHash) == probeDist and fileHash in results:
+                continue
+
+            # Failed files are not submitted again until asked to
+            key = ("summary", fileHash, probeDist)
+            error = pool.failure(key)
+            if error is not None:
+                failed[key] = error
+                pool.forget(key)
+            if key in failed:
+                st.error(f"`{f.name}` could not be processed: {failed[key]}", icon="🚫")
+                continue
+
+            future = pool.submit(key, fileSummary, f.getvalue(), probeDist)
+            if not future.done():
+                jobs[f.name] = key
+            else:
+                results.add(fileHash, f.name, future.result())
+                summarized[fileHash] = probeDist
+
+        if any(k[0] == "summary" for k in failed):
+            st.button("↻ Try the failed files again", on_click=retryFailed)
+
+        if jobs:
+            uploadProgress(jobs)
+
+    if results:
+        st.dataframe(results.toFrame().drop(columns='key').style.format(precision=4), height=200)
+        st.caption(f"{len(results)} files stored, up to {results.capacity} are kept.")
+
+profile = results.toFrame() if results else None
 st.warning(
     r"""
     Try to fit a logarithmic curve to your profile data, e.g.,
@@ -219,7 +394,7 @@ st.info(
 col1,col2 = st.columns([1,2.5])
 
 with col2:
-    st.plotly_chart(velocityProfilePlot(col1),use_container_width=True)
+    st.plotly_chart(velocityProfilePlot(col1,profile,st.session_state["_flumeDepth"]),use_container_width=True)
 
 r"""
 An important feature of the velocity profile $\overline{u}(t)$ is its **derivative 
@@ -253,6 +428,9 @@ upwards around the stoss side of the dunes.
 
 st.warning("Which is the vertical component of the ADV velocity readings?", icon="⬆️")
 
+if profile is not None:
+    st.plotly_chart(componentsProfilePlot(profile,st.session_state["_flumeDepth"]),use_container_width=True)
+
 r"""
 ****
 ### Reynolds stress profiles
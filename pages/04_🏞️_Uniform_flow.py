@@ -267,4 +267,61 @@ with col2:
 
         Report your bed form geometry measurements and compare the $k_s$ 
         estimations from this and the previous sections.
-        """, icon="☑️")
\ No newline at end of file
+        """, icon="☑️")
+
+r"""
+****
+
+## 🧮 Check your calculations
+
+Open the calculator and add one row per run to its table. All the runs are solved at once
+with the expressions above: $f$ from the Darcy-Weisbach equation, $k_s$
+inverted from the channel friction relation, and the friction factor
+$f_{\rm bed}$ that the van Rijn roughness of your bed forms would predict.
+"""
+
+def runsCalculator():
+    '''Editable table of runs and their uniform flow parameters'''
+    # pandas and the solvers are only loaded once the calculator is opened
+    import pandas as pd
+
+    from adv_processing import FLUME_WIDTH, uniformFlow, vanRijnRoughness
+
+    if "_runs" not in st.session_state.keys():
+        st.session_state["_runs"] = pd.DataFrame({
+            "Q [L/s]"     : [5.0],
+            "y [m]"       : [st.session_state.get("_flumeDepth", 0.15)],
+            "S0 [-]"      : [0.001],
+            "d90 [mm]"    : [0.6],
+            "Δ [m]"       : [0.02],
+            "λ [m]"       : [0.15]})
+
+    runs = st.data_editor(st.session_state["_runs"], num_rows="dynamic",
+        use_container_width=True, key="_runsEditor").dropna()
+
+    if len(runs) and (runs[["Q [L/s]", "y [m]", "S0 [-]", "λ [m]"]] > 0).all(axis=None):
+        ksBed = vanRijnRoughness(runs["d90 [mm]"]/1000, runs["Δ [m]"], runs["λ [m]"])
+        results = uniformFlow(runs["Q [L/s]"]/1000, runs["y [m]"], runs["S0 [-]"],
+            width=FLUME_WIDTH, ksBed=ksBed)
+
+        results.index = runs.index
+        st.dataframe(results.rename(columns={
+                "RH"     : "R_H [m]",
+                "U"      : "U [m/s]",
+                "Re"     : "Re [-]",
+                "tau0"   : "τ₀ [Pa]",
+                "ustar"  : "u* [m/s]",
+                "deltaV" : "δv [m]",
+                "f"      : "f [-]",
+                "ks"     : "ks [m]",
+                "ksBed"  : "ks van Rijn [m]",
+                "fBed"   : "f van Rijn [-]"}),
+            use_container_width=True)
+
+        if results["ks"].isna().any():
+            st.caption("A missing $k_s$ means the measured $f$ is lower than the smooth-bed limit for that $\\mathcal{R}$.")
+    else:
+        st.caption("Flow rate, depth, slope and bed form length must be positive.")
+
+if st.toggle("🧮 Open the calculator", key="calculator"):
+    runsCalculator()